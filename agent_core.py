@@ -1,17 +1,136 @@
+import re
+import time
+import threading
 import requests
 import json
 import yaml
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from tool_registry import ToolRegistry
+from context_manager import ContextWindowManager
+
+# 工具调用解析模式，支持JSON格式参数
+TOOL_CALL_PATTERNS = [
+    # 模式1: TOOL_CALL: tool_name {json} - 正确处理一层嵌套大括号
+    re.compile(r"TOOL_CALL:\s*(\w+)\s*\{((?:[^{}]|\{[^{}]*\})*)\}", re.IGNORECASE),
+    # 模式2: 工具调用: tool_name(json)
+    re.compile(r"工具调用:\s*(\w+)\s*\(([^)]+)\)", re.IGNORECASE),
+    # 模式3: 使用tool_name工具 {json} - 正确处理一层嵌套大括号
+    re.compile(r"使用(\w+)工具\s*\{((?:[^{}]|\{[^{}]*\})*)\}", re.IGNORECASE)
+]
+
+# 终端工具：会改变终端状态，需要按顺序执行
+TERMINAL_TOOLS = ('send_terminal_command', 'send_terminal_key')
+
+
+# Ollama响应中的性能指标字段（耗时单位为纳秒）
+METRIC_FIELDS = (
+    "total_duration", "load_duration", "prompt_eval_count",
+    "prompt_eval_duration", "eval_count", "eval_duration"
+)
+
+
+class ModelMetrics:
+    """记录每次模型调用的性能指标（线程安全）"""
+    
+    def __init__(self, max_history: int = 200):
+        self.records = deque(maxlen=max_history)
+        self.lock = threading.Lock()
+    
+    def record(self, response: Dict[str, Any], kind: str = "chat") -> Dict[str, Any]:
+        """从Ollama响应中提取性能指标并保存，返回本次指标（耗时换算为毫秒）"""
+        entry = {"kind": kind, "time": time.time()}
+        for field in METRIC_FIELDS:
+            value = response.get(field, 0) or 0
+            if field.endswith("_duration"):
+                entry[field.replace("_duration", "_ms")] = round(value / 1e6, 1)
+            else:
+                entry[field] = value
+        with self.lock:
+            self.records.append(entry)
+        return entry
+    
+    def summary(self) -> Dict[str, Any]:
+        """汇总最近的模型调用指标"""
+        with self.lock:
+            records = list(self.records)
+        chat_records = [r for r in records if r["kind"] == "chat"]
+        count = len(chat_records)
+        
+        def average(field):
+            return round(sum(r[field] for r in chat_records) / count, 1) if count else 0
+        
+        return {
+            "requests": count,
+            # load_ms明显大于0说明本次请求触发了模型加载
+            "cold_loads": sum(1 for r in chat_records if r["load_ms"] > 100),
+            "avg_load_ms": average("load_ms"),
+            "avg_prompt_eval_count": average("prompt_eval_count"),
+            "avg_prompt_eval_ms": average("prompt_eval_ms"),
+            "avg_total_ms": average("total_ms"),
+            "recent": records[-10:]
+        }
+
+
+def create_http_session(config) -> requests.Session:
+    """创建访问Ollama的连接池会话
+    
+    会话复用keep-alive连接，连接池本身是线程安全的，可在Flask多线程间共享。
+    连接失败（请求尚未发出）对所有方法重试；网关错误（502/503/504）只对GET重试——
+    POST到达Ollama后可能已经开始生成，重发会重复触发模型生成。不对读取超时重试。
+    """
+    retry = Retry(
+        total=config.OLLAMA_MAX_RETRIES,
+        connect=config.OLLAMA_MAX_RETRIES,
+        read=0,
+        status=config.OLLAMA_MAX_RETRIES,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),  # 决定哪些方法按状态码/读取错误重试，连接失败不受此限制
+        backoff_factor=config.OLLAMA_RETRY_BACKOFF,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,  # 只访问Ollama一个主机
+        pool_maxsize=config.OLLAMA_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class AgentCore:
     """智能体核心类"""
     
-    def __init__(self, config, tool_registry: ToolRegistry):
+    def __init__(self, config, tool_registry: ToolRegistry, http_session: Optional[requests.Session] = None):
         self.config = config
         self.tool_registry = tool_registry
+        # 原生工具调用模式：工具定义通过Ollama的tools字段传递，模型返回结构化tool_calls
+        self.native_tools = config.TOOL_CALLING_MODE == "native"
         self.system_prompt = self._load_system_prompt()
         self.conversation_history = []
+        # 上下文窗口管理：按token预算装入历史、压缩超大工具结果
+        self.context_manager = ContextWindowManager(
+            token_budget=config.CONTEXT_TOKEN_BUDGET,
+            tool_result_token_limit=config.CONTEXT_TOOL_RESULT_TOKENS
+        )
+        # 并行执行工具调用的线程池
+        self.tool_executor = ThreadPoolExecutor(
+            max_workers=config.AGENT_MAX_PARALLEL_TOOLS,
+            thread_name_prefix="agent-tool"
+        )
+        # 共享的Ollama连接池会话
+        self.http_session = http_session or create_http_session(config)
+        self.timeout = (config.OLLAMA_CONNECT_TIMEOUT, config.OLLAMA_READ_TIMEOUT)
+        # 模型驻留管理与性能指标
+        self.metrics = ModelMetrics(config.MODEL_METRICS_HISTORY)
+        self._last_model_call = 0.0
+        self._warmer_stop = threading.Event()
+        self._warmer_thread = None
     
     def _load_system_prompt(self) -> str:
         """加载系统提示词"""
@@ -19,6 +138,11 @@ class AgentCore:
             with open(self.config.SYSTEM_PROMPT_FILE, 'r', encoding='utf-8') as f:
                 data = yaml.safe_load(f)
                 system_prompt = data.get('system_prompt', '')
+                # 原生工具调用模式下，工具格式和工具列表由tools字段提供，从提示词中去掉
+                if self.native_tools:
+                    system_prompt = self._strip_prompt_sections(
+                        system_prompt, data.get('native_mode_skip_sections', [])
+                    )
                 # 替换后端API基础URL占位符
                 system_prompt = system_prompt.replace('{backend_api_base}', self.config.BACKEND_API_BASE)
                 return system_prompt
@@ -26,169 +150,373 @@ class AgentCore:
             print(f"加载系统提示词失败: {e}")
             return "你是一个有用的助手。"
     
-    def _call_ollama(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
-        """调用Ollama API"""
-        url = self.config.get_chat_endpoint()
-        
+    @staticmethod
+    def _strip_prompt_sections(system_prompt: str, section_names: List[str]) -> str:
+        """删除提示词中指定的【章节】（从章节标题到下一个章节标题之前）"""
+        for name in section_names:
+            system_prompt = re.sub(
+                rf"【{re.escape(name)}】.*?(?=【|\Z)", "", system_prompt, flags=re.DOTALL
+            )
+        return system_prompt
+    
+    def _build_payload(self, messages: List[Dict[str, Any]], stream: bool) -> Dict[str, Any]:
+        """构建Ollama请求体"""
         payload = {
             "model": self.config.MODEL_NAME,
             "messages": messages,
-            "stream": False,
-            **self.config.MODEL_PARAMS
+            **self.config.MODEL_PARAMS,
+            "stream": stream,  # 放在MODEL_PARAMS之后，避免被其中的stream=False覆盖
+            "keep_alive": self.config.OLLAMA_KEEP_ALIVE
         }
+        if self.native_tools:
+            payload["tools"] = self.tool_registry.get_ollama_tools()
+        return payload
+    
+    def _call_ollama(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """调用Ollama API"""
+        url = self.config.get_chat_endpoint()
+        payload = self._build_payload(messages, stream=False)
         
+        self._last_model_call = time.monotonic()
         try:
-            response = requests.post(url, json=payload, timeout=30)
+            response = self.http_session.post(url, json=payload, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"调用Ollama API失败: {e}")
     
+    def _call_ollama_stream(self, messages: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        """流式调用Ollama API，逐个产出NDJSON数据块"""
+        url = self.config.get_chat_endpoint()
+        payload = self._build_payload(messages, stream=True)
+        
+        self._last_model_call = time.monotonic()
+        try:
+            with self.http_session.post(url, json=payload, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise Exception(f"调用Ollama API失败: {chunk['error']}")
+                    # 不在done时提前退出：读完整个响应体，连接才能归还连接池复用
+                    yield chunk
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"调用Ollama API失败: {e}")
+    
+    def _parse_tool_params(self, params_str: str) -> Dict[str, Any]:
+        """解析工具参数字符串（不含最外层大括号的JSON片段）"""
+        params_str = params_str.strip()
+        if not params_str:
+            return {}
+        try:
+            # 修复JSON解析：处理可能的格式问题
+            # 1. 添加外层大括号
+            json_str = f"{{{params_str}}}"
+            # 2. 移除可能的尾随逗号
+            json_str = re.sub(r',\s*([}\]])', r' \1', json_str)
+            return json.loads(json_str)
+        except json.JSONDecodeError as e:
+            print(f"JSON解析错误: {e}")
+            print(f"原始参数字符串: {params_str}")
+            # 如果JSON解析失败，返回空参数
+            return {}
+    
+    def _extract_tool_calls(self, response_text: str) -> List[Dict[str, Any]]:
+        """从模型响应中提取全部工具调用，按出现顺序返回（去除重复调用）"""
+        found = []
+        for pattern in TOOL_CALL_PATTERNS:
+            for match in pattern.finditer(response_text):
+                found.append((match.start(), match.end(), match.group(1).strip(), match.group(2)))
+        
+        tool_calls = []
+        seen = set()
+        last_end = -1
+        for start, end, tool_name, params_str in sorted(found):
+            # 不同模式匹配到同一段文本时只取第一个
+            if start < last_end:
+                continue
+            last_end = end
+            params = self._parse_tool_params(params_str)
+            signature = (tool_name, json.dumps(params, sort_keys=True, ensure_ascii=False))
+            if signature in seen:
+                continue
+            seen.add(signature)
+            tool_calls.append({"name": tool_name, "parameters": params})
+        return tool_calls
+    
     def _extract_tool_call(self, response_text: str) -> Optional[Dict[str, Any]]:
-        """从模型响应中提取工具调用（简化版本）"""
-        # 在实际应用中，这里应该使用更复杂的解析逻辑
-        # 这里简化处理，假设模型会以特定格式返回工具调用
-        import re
-        import json
-        
-        # 更强大的解析模式，支持JSON格式参数
-        tool_patterns = [
-            # 模式1: TOOL_CALL: tool_name {json} - 使用贪婪匹配并正确处理嵌套大括号
-            r"TOOL_CALL:\s*(\w+)\s*\{((?:[^{}]|\{[^{}]*\})*)\}",
-            # 模式2: 工具调用: tool_name(json)
-            r"工具调用:\s*(\w+)\s*\(([^)]+)\)",
-            # 模式3: 使用tool_name工具 {json} - 使用贪婪匹配并正确处理嵌套大括号
-            r"使用(\w+)工具\s*\{((?:[^{}]|\{[^{}]*\})*)\}"
-        ]
-        
-        for pattern in tool_patterns:
-            match = re.search(pattern, response_text, re.IGNORECASE)
-            if match:
-                tool_name = match.group(1).strip()
-                params_str = match.group(2).strip()
-                
+        """从模型响应中提取第一个工具调用"""
+        tool_calls = self._extract_tool_calls(response_text)
+        return tool_calls[0] if tool_calls else None
+    
+    def _build_messages(self, user_message: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """构建发送给模型的消息列表（历史按token预算从新到旧装入）"""
+        return self.context_manager.build_messages(self.system_prompt, history, user_message)
+    
+    def _remember(self, history: List[Dict[str, str]], user_message: str, assistant_message: str) -> None:
+        """更新对话历史"""
+        history.append({"role": "user", "content": user_message})
+        history.append({"role": "assistant", "content": assistant_message})
+    
+    def _run_tool(self, tool_call: Dict[str, Any], terminal_commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """执行工具并收集终端命令
+        
+        Returns:
+            {"result": 工具结果} 或 {"error_response": 需直接返回给用户的响应}
+        """
+        tool_name = tool_call["name"]
+        tool_params = tool_call["parameters"]
+        
+        # 执行工具
+        tool_result = self.tool_registry.execute_tool(tool_name, **tool_params)
+        
+        # 超时、并发已满等执行层错误直接交给模型处理
+        if isinstance(tool_result, dict) and tool_result.get("error_code"):
+            return {"result": tool_result}
+        
+        # 检查是否是终端工具，收集终端命令
+        if tool_name in TERMINAL_TOOLS:
+            # 检查工具执行是否成功
+            if tool_result.get("success", False):
+                if tool_name == 'send_terminal_command':
+                    terminal_commands.append({
+                        "type": "command",
+                        "text": tool_params.get('command', ''),
+                        "speed": tool_params.get('speed', 30),
+                        "enter": tool_params.get('enter', True)
+                    })
+                elif tool_name == 'send_terminal_key':
+                    terminal_commands.append({
+                        "type": "key",
+                        "key": tool_params.get('key', '')
+                    })
+            else:
+                # 终端未连接，返回错误信息
+                error_msg = tool_result.get("message", "终端未连接")
+                hint = tool_result.get("hint", "")
+                return {
+                    "error_response": {
+                        "response": f"{error_msg}\n\n{hint}",
+                        "terminal_commands": terminal_commands,
+                        "error": "TERMINAL_NOT_CONNECTED"
+                    }
+                }
+        
+        return {"result": tool_result}
+    
+    def _run_tool_safely(self, tool_call: Dict[str, Any], terminal_commands: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """执行工具，异常转换为错误结果交给模型处理"""
+        try:
+            return self._run_tool(tool_call, terminal_commands)
+        except Exception as e:
+            return {"result": {"error": f"执行工具 {tool_call['name']} 失败: {str(e)}"}}
+    
+    def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]],
+                            terminal_commands: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """执行一批工具调用，结果顺序与调用顺序一致
+        
+        相互独立的工具在线程池中并行执行；终端工具会改变终端状态，按原顺序串行执行。
+        """
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+        futures = {}
+        for index, tool_call in enumerate(tool_calls):
+            if tool_call["name"] in TERMINAL_TOOLS:
+                continue
+            futures[index] = self.tool_executor.submit(self._run_tool_safely, tool_call, terminal_commands)
+        
+        for index, tool_call in enumerate(tool_calls):
+            if tool_call["name"] in TERMINAL_TOOLS:
+                outcomes[index] = self._run_tool_safely(tool_call, terminal_commands)
+        
+        for index, future in futures.items():
+            outcomes[index] = future.result()
+        
+        return outcomes
+    
+    def _tool_result_message(self, tool_name: str, tool_result: Any, native: bool = False) -> Dict[str, str]:
+        """将工具结果包装为消息（超出上限的结果会被压缩）
+        
+        原生工具调用使用tool角色消息，文本格式的工具调用使用系统消息。
+        """
+        content = self.context_manager.compact_tool_result(tool_result)
+        if native:
+            return {"role": "tool", "tool_name": tool_name, "content": content}
+        return {
+            "role": "system",
+            "content": f"工具 {tool_name} 执行结果: {content}"
+        }
+    
+    def _parse_native_tool_calls(self, raw_tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把Ollama返回的结构化tool_calls转换为统一的工具调用格式"""
+        tool_calls = []
+        for raw_call in raw_tool_calls:
+            function = raw_call.get("function", {})
+            arguments = function.get("arguments") or {}
+            if isinstance(arguments, str):
                 try:
-                    # 首先尝试解析为JSON
-                    if params_str:
-                        # 修复JSON解析：处理可能的格式问题
-                        # 确保params_str是一个完整的JSON对象
-                        # 1. 添加外层大括号
-                        json_str = f"{{{params_str}}}"
-                        # 2. 移除可能的尾随逗号
-                        json_str = re.sub(r',\s*([}\]])', r' \1', json_str)
-                        params = json.loads(json_str)
-                    else:
-                        params = {}
-                    return {"name": tool_name, "parameters": params}
-                except json.JSONDecodeError as e:
-                    print(f"JSON解析错误: {e}")
-                    print(f"原始参数字符串: {params_str}")
-                    # 如果JSON解析失败，返回空参数
-                    return {"name": tool_name, "parameters": {}}
-        
-        return None
-    
-    def process_message(self, user_message: str) -> Dict[str, Any]:
+                    arguments = json.loads(arguments)
+                except json.JSONDecodeError:
+                    arguments = {}
+            tool_calls.append({"name": function.get("name", ""), "parameters": arguments})
+        return tool_calls
+    
+    def _model_round(self, messages: List[Dict[str, Any]], reply: Dict[str, list], stream: bool) -> Iterator[Dict[str, Any]]:
+        """执行一轮模型调用
+        
+        完整文本收集到reply["parts"]，结构化工具调用收集到reply["tool_calls"]，
+        性能指标追加到reply["metrics"]；流式模式下逐个产出增量事件。
+        """
+        if not stream:
+            response = self._call_ollama(messages)
+            message = response.get("message", {})
+            reply["parts"].append(message.get("content", ""))
+            reply["tool_calls"].extend(message.get("tool_calls") or [])
+            reply["metrics"].append(self.metrics.record(response))
+            return
+        
+        for chunk in self._call_ollama_stream(messages):
+            if chunk.get("done"):
+                # 最后一个数据块携带本轮的性能指标
+                reply["metrics"].append(self.metrics.record(chunk))
+            message = chunk.get("message", {})
+            reply["tool_calls"].extend(message.get("tool_calls") or [])
+            delta = message.get("content", "")
+            if delta:
+                reply["parts"].append(delta)
+                yield {"type": "delta", "content": delta}
+    
+    def _agent_loop(self, user_message: str, history: List[Dict[str, str]], stream: bool) -> Iterator[Dict[str, Any]]:
+        """多步工具调用循环
+        
+        每轮解析模型响应中的全部工具调用并行执行，把结果一起交还模型，
+        直到模型不再调用工具，或达到步数/耗时上限。
+        """
+        terminal_commands = []
+        round_metrics = []
+        messages = self._build_messages(user_message, history)
+        started = time.monotonic()
+        max_steps = self.config.AGENT_MAX_STEPS
+        
+        step = 0
+        while True:
+            reply = {"parts": [], "tool_calls": [], "metrics": round_metrics}
+            yield from self._model_round(messages, reply, stream)
+            assistant_message = "".join(reply["parts"])
+            native_calls = reply["tool_calls"]
+            
+            # 已达到步数上限时不再执行工具，本轮响应即最终回答
+            tool_calls = []
+            if step < max_steps:
+                # 优先使用结构化tool_calls，模型未返回时回退到文本解析
+                tool_calls = self._parse_native_tool_calls(native_calls) or self._extract_tool_calls(assistant_message)
+            if not tool_calls:
+                self._remember(history, user_message, assistant_message)
+                yield {"type": "done", "response": assistant_message, "terminal_commands": terminal_commands,
+                       "metrics": round_metrics}
+                return
+            
+            step += 1
+            tool_names = [tool_call["name"] for tool_call in tool_calls]
+            yield {"type": "tool_call", "name": ", ".join(tool_names), "names": tool_names, "step": step}
+            
+            outcomes = self._execute_tool_calls(tool_calls, terminal_commands)
+            for outcome in outcomes:
+                if "error_response" in outcome:
+                    error_response = outcome["error_response"]
+                    self._remember(history, user_message, error_response["response"])
+                    yield {"type": "done", **error_response, "metrics": round_metrics}
+                    return
+            
+            # 将本轮全部工具结果交还模型
+            assistant_entry = {"role": "assistant", "content": assistant_message}
+            if native_calls:
+                assistant_entry["tool_calls"] = native_calls
+            messages.append(assistant_entry)
+            for tool_call, outcome in zip(tool_calls, outcomes):
+                messages.append(self._tool_result_message(tool_call["name"], outcome["result"], native=bool(native_calls)))
+            
+            # 步数或耗时预算用尽：要求模型直接给出最终回答
+            if step >= max_steps or time.monotonic() - started > self.config.AGENT_TIME_BUDGET_SECONDS:
+                step = max_steps
+                messages.append({"role": "system", "content": "工具调用次数已达上限，请直接根据以上工具结果回答用户，不要再调用工具。"})
+    
+    def process_message(self, user_message: str, history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
         """处理用户消息，返回响应和终端命令
         
         Args:
             user_message: 用户消息
+            history: 对话历史（会被原地追加），默认使用实例自身的conversation_history
         """
-        # 初始化终端命令列表
-        terminal_commands = []
+        if history is None:
+            history = self.conversation_history
         
-        # 构建消息历史
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            *self.conversation_history[-5:],  # 只保留最近5条历史
-            {"role": "user", "content": user_message}
-        ]
+        for event in self._agent_loop(user_message, history, stream=False):
+            if event["type"] == "done":
+                event.pop("type")
+                return event
+    
+    def process_message_stream(self, user_message: str, history: Optional[List[Dict[str, str]]] = None) -> Iterator[Dict[str, Any]]:
+        """流式处理用户消息，逐个产出事件
         
-        # 获取模型响应
-        response = self._call_ollama(messages)
-        assistant_message = response.get("message", {}).get("content", "")
+        事件类型:
+            delta: 模型输出的增量文本 {"type": "delta", "content": str}
+            tool_call: 模型请求调用工具，此前输出的增量文本是工具调用指令 {"type": "tool_call", "name": str, "names": list, "step": int}
+            done: 处理结束 {"type": "done", "response": str, "terminal_commands": list, "metrics": list, ["error": str]}
         
-        # 检查是否需要工具调用
-        tool_call = self._extract_tool_call(assistant_message)
+        Args:
+            user_message: 用户消息
+            history: 对话历史（会被原地追加），默认使用实例自身的conversation_history
+        """
+        if history is None:
+            history = self.conversation_history
         
-        if tool_call:
-            tool_name = tool_call["name"]
-            tool_params = tool_call["parameters"]
-            
-            try:
-                # 执行工具
-                tool_result = self.tool_registry.execute_tool(tool_name, **tool_params)
-                
-                # 检查是否是终端工具，收集终端命令
-                if tool_name in ['send_terminal_command', 'send_terminal_key']:
-                    # 检查工具执行是否成功
-                    if tool_result.get("success", False):
-                        if tool_name == 'send_terminal_command':
-                            terminal_commands.append({
-                                "type": "command",
-                                "text": tool_params.get('command', ''),
-                                "speed": tool_params.get('speed', 30),
-                                "enter": tool_params.get('enter', True)
-                            })
-                        elif tool_name == 'send_terminal_key':
-                            terminal_commands.append({
-                                "type": "key",
-                                "key": tool_params.get('key', '')
-                            })
-                    else:
-                        # 终端未连接，返回错误信息
-                        error_msg = tool_result.get("message", "终端未连接")
-                        hint = tool_result.get("hint", "")
-                        
-                        # 更新对话历史
-                        self.conversation_history.append({"role": "user", "content": user_message})
-                        self.conversation_history.append({"role": "assistant", "content": f"{error_msg}\n\n{hint}"})
-                        
-                        return {
-                            "response": f"{error_msg}\n\n{hint}",
-                            "terminal_commands": terminal_commands,
-                            "error": "TERMINAL_NOT_CONNECTED"
-                        }
-                
-                # 将工具结果作为系统消息添加到对话中
-                result_message = {
-                    "role": "system",
-                    "content": f"工具 {tool_name} 执行结果: {json.dumps(tool_result, ensure_ascii=False)}"
-                }
-                
-                # 再次调用模型，提供工具结果
-                messages.append({"role": "assistant", "content": assistant_message})
-                messages.append(result_message)
-                
-                final_response = self._call_ollama(messages)
-                final_message = final_response.get("message", {}).get("content", "")
-                
-                # 更新对话历史
-                self.conversation_history.append({"role": "user", "content": user_message})
-                self.conversation_history.append({"role": "assistant", "content": final_message})
-                
-                # 返回响应和终端命令
-                return {
-                    "response": final_message,
-                    "terminal_commands": terminal_commands
-                }
-                
-            except Exception as e:
-                error_message = f"执行工具 {tool_name} 失败: {str(e)}"
-                return {
-                    "response": error_message,
-                    "terminal_commands": terminal_commands
-                }
-        else:
-            # 没有工具调用
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": assistant_message})
-            
-            return {
-                "response": assistant_message,
-                "terminal_commands": terminal_commands
-            }
+        yield from self._agent_loop(user_message, history, stream=True)
+    
+    def warm_model(self) -> Dict[str, Any]:
+        """预热模型：加载模型并预填充系统提示词
+        
+        系统提示词（原生模式下还有工具定义）是每次请求都相同的前缀，
+        预填充后Ollama可以复用这段KV缓存，后续请求只需计算新增部分。
+        """
+        payload = self._build_payload([{"role": "system", "content": self.system_prompt}], stream=False)
+        payload["options"] = {"num_predict": 1}
+        
+        self._last_model_call = time.monotonic()
+        try:
+            response = self.http_session.post(self.config.get_chat_endpoint(), json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return self.metrics.record(response.json(), kind="warmup")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"预热模型失败: {e}")
+    
+    def start_model_warmer(self) -> None:
+        """启动后台预热线程：启动时预热一次，之后空闲超过阈值再次预热，避免模型被卸载"""
+        if self._warmer_thread is not None:
+            return
+        
+        def run():
+            idle_seconds = self.config.MODEL_WARMUP_IDLE_SECONDS
+            while not self._warmer_stop.is_set():
+                if time.monotonic() - self._last_model_call >= idle_seconds or self._last_model_call == 0.0:
+                    try:
+                        self.warm_model()
+                    except Exception as e:
+                        print(f"{e}")
+                idle = time.monotonic() - self._last_model_call
+                self._warmer_stop.wait(max(idle_seconds - idle, 1))
+        
+        self._warmer_thread = threading.Thread(target=run, name="model-warmer", daemon=True)
+        self._warmer_thread.start()
     
     def clear_history(self) -> None:
         """清除对话历史"""
-        self.conversation_history = []
\ No newline at end of file
+        self.conversation_history = []
+    
+    def close(self) -> None:
+        """关闭预热线程、连接池、工具线程池和异步工具的事件循环"""
+        self._warmer_stop.set()
+        self.tool_executor.shutdown(wait=False)
+        self.tool_registry.close()
+        self.http_session.close()
\ No newline at end of file
@@ -1,5 +1,8 @@
 import os
+import atexit
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Dict, Any
 
 
@@ -8,25 +11,6 @@ log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'log')
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
-# 全局日志配置（只初始化一次）
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'global_debug.log'),  
-    filemode='a',  
-    level=logging.INFO,
-    format='%(asctime)s - %(module)s - %(funcName)s - %(levelname)s: %(message)s',  
-    datefmt='%Y-%m-%d %H:%M:%S',
-    encoding='utf-8'
-)
-
-# logging.basicConfig(
-#     filename='global_debug.log',  
-#     filemode='a',  
-#     level=logging.INFO,
-#     format='%(asctime)s - %(module)s - %(funcName)s - %(levelname)s: %(message)s',  
-#     datefmt='%Y-%m-%d %H:%M:%S',
-#     encoding='utf-8'
-# )
-
 
 class Config:
     """配置类"""
@@ -35,9 +19,52 @@ class Config:
     OLLAMA_API_BASE = "http://localhost:11434/api"
     MODEL_NAME = "qwen3:8b"  
     
+    # Ollama连接池配置（所有Ollama请求共享一个keep-alive会话）
+    OLLAMA_POOL_SIZE = 10             # 连接池大小，建议不小于Flask并发线程数
+    OLLAMA_MAX_RETRIES = 3            # 连接失败/网关错误的重试次数
+    OLLAMA_RETRY_BACKOFF = 0.5        # 重试退避系数（秒）：0.5, 1, 2...
+    OLLAMA_CONNECT_TIMEOUT = 5        # 建立连接超时（秒）
+    OLLAMA_READ_TIMEOUT = 120         # 读取超时（秒），流式模式下为两个数据块之间的最大间隔
+    
+    # 模型驻留配置
+    OLLAMA_KEEP_ALIVE = "30m"            # 模型在Ollama中的驻留时长（如"30m"、"2h"，-1表示常驻）
+    MODEL_WARMUP_ENABLED = True          # 启动时在后台预加载模型并预填充系统提示词
+    MODEL_WARMUP_IDLE_SECONDS = 1500     # 空闲超过该时长后重新预热（应小于OLLAMA_KEEP_ALIVE）
+    MODEL_METRICS_HISTORY = 200          # 保留最近多少次模型调用的性能指标
+    
+    # Web会话配置（每个浏览器会话独立保存对话历史）
+    SESSION_MAX_COUNT = 200             # 最多保留的会话数（LRU淘汰）
+    SESSION_TTL_SECONDS = 3600          # 会话空闲超时（秒）
+    SESSION_MAX_MEMORY_MB = 64          # 所有会话对话历史的总内存上限（MB）
+    SESSION_MAX_HISTORY_MESSAGES = 40   # 单个会话最多保留的历史消息条数
+    
+    # 上下文窗口配置（按token预算组装历史，替代固定条数截取）
+    CONTEXT_TOKEN_BUDGET = 6000          # 系统提示词+历史+当前消息的token预算
+    CONTEXT_TOOL_RESULT_TOKENS = 1500    # 单个工具结果送入模型前的token上限
+    
+    # 多步工具调用配置
+    AGENT_MAX_STEPS = 4                  # 单条消息最多执行的工具调用轮数
+    AGENT_TIME_BUDGET_SECONDS = 90       # 单条消息的耗时预算，超出后要求模型直接回答
+    AGENT_MAX_PARALLEL_TOOLS = 4         # 同一轮内并行执行的工具数
+    
+    # 工具调用模式
+    # prompt: 工具列表写在系统提示词中，从模型文本中解析TOOL_CALL
+    # native: 工具定义通过Ollama的tools字段传递，模型返回结构化tool_calls（需模型支持工具调用）
+    TOOL_CALLING_MODE = "prompt"
+    
     # 工具配置
     TOOLS_DEFINITIONS_DIR = "tools/definitions"
     TOOLS_IMPLEMENTATIONS_DIR = "tools/implementations"
+    TOOLS_MANIFEST_PATH = "log/tool_manifest.json"  # 工具清单缓存（工具名 -> 模块:属性），源码变化时自动重建
+    
+    # 工具执行策略默认值（工具定义中的execution字段可逐个覆盖：timeout/max_concurrency/concurrency_group/executor）
+    TOOL_DEFAULT_TIMEOUT = 120                      # 工具执行超时（秒），超时返回错误，不再等待
+    TOOL_DEFAULT_MAX_CONCURRENCY = 4                # 单个工具同时执行的调用数上限
+    TOOL_SLOT_WAIT_SECONDS = 5                      # 并发已满时等待空闲名额的最长时间（秒）
+    TOOL_THREAD_WORKERS = 16                        # 执行工具的线程池大小
+    TOOL_PROCESS_WORKERS = 2                        # 执行CPU密集型工具（executor=process）的进程池大小
+    TOOL_RESULT_CACHE_ENTRIES = 256                 # 缓存的工具结果数（工具定义中cache字段开启的工具，如 {"ttl": 60}）
+    TOOL_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 缓存的工具结果总内存上限
     
     # 系统提示词文件
     SYSTEM_PROMPT_FILE = "prompts/system_prompt.yaml"
@@ -48,6 +75,31 @@ class Config:
     # 日志文件配置
     DEFAULT_LOG_FILE_PATH = "g:\\phpstudy_pro\\.jqgh\\NewInformationTechnology\\Agent\\geoserver.log.1"
     
+    # 威胁特征规则文件（GeoServer日志分析与渗透痕迹检测共用）
+    THREAT_RULES_FILE = "tools/rules/threat_signatures.json"
+    
+    # 日志分析并行配置
+    LOG_ANALYSIS_WORKERS = 0                        # 并行解析的进程数，0表示使用CPU核数
+    LOG_PARALLEL_MIN_BYTES = 32 * 1024 * 1024       # 日志总大小超过该值才启用多进程
+    LOG_PARALLEL_CHUNK_MIN_BYTES = 8 * 1024 * 1024  # 每个并行任务的最小区间大小
+    LOG_FOLLOW_STATE_DIR = "log/follow_state"       # 跟踪模式的读取位置和累计结果保存目录
+    LOG_CORRELATION_TTL_SECONDS = 300               # 发起日志等待耗时日志的最长日志时间，超时按无响应时间输出
+    LOG_CORRELATION_MAX_ENTRIES = 50000             # 同时等待配对的请求数上限
+    LOG_INDEX_DB_PATH = "log/geoserver_index.db"    # 日志索引（SQLite）数据库文件
+    LOG_REPORT_PAGE_SIZE = 20                       # 威胁报告每页默认条数
+    LOG_REPORT_MAX_BYTES = 16 * 1024                # 威胁报告每页威胁条目的默认字节预算
+    LOG_RESULT_CACHE_ENTRIES = 16                   # 缓存的日志分析结果数（按文件大小和修改时间失效）
+    LOG_RESULT_CACHE_MAX_BYTES = 128 * 1024 * 1024  # 缓存的日志分析结果总内存上限
+    
+    # 全局日志（log/global_debug.log）配置
+    LOG_FILE_MAX_BYTES = 20 * 1024 * 1024           # 单个日志文件大小上限，超过后轮转为 .1 .2 ...
+    LOG_FILE_BACKUP_COUNT = 5                       # 保留的轮转日志个数
+    TOOL_LOG_MAX_CHARS = 2000                       # 工具调用日志中入参/出参渲染后的最大字符数
+    TOOL_LOG_SAMPLE_RATES = {                       # 高频工具的调用日志采样率（未列出的工具全部记录，异常始终记录）
+        "get_current_time": 0.1,
+        "calculate": 0.1
+    }
+    
     # 模型参数
     MODEL_PARAMS = {
         "temperature": 0.7,
@@ -76,3 +128,65 @@ class Config:
 
 # 单例配置实例
 config = Config()
+
+
+_log_listener = None
+_log_queue = None
+
+LOG_FORMAT = '%(asctime)s - %(module)s - %(funcName)s - %(levelname)s: %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def setup_logging() -> None:
+    """
+    全局日志配置（每个进程只初始化一次）
+    主进程：日志记录先进入进程间队列，由后台线程写入按大小轮转的日志文件，调用线程不等待磁盘I/O；
+           只有主进程打开global_debug.log，轮转时不会被子进程占用（Windows下被占用的文件无法重命名）
+    子进程：fork启动的子进程继承主进程的队列处理器，日志经同一队列交给主进程写入；
+           spawn启动的进程池通过init_worker_logging接入该队列，未接入前写入各自的global_debug.<pid>.log
+    """
+    global _log_listener, _log_queue
+    root = logging.getLogger()
+    if _log_listener is not None or any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return
+
+    if multiprocessing.parent_process() is not None:
+        # delay=True：由init_worker_logging接入主进程队列的子进程不会创建这个文件
+        worker_handler = logging.FileHandler(os.path.join(log_dir, f'global_debug.{os.getpid()}.log'),
+                                             encoding='utf-8', delay=True)
+        worker_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        root.setLevel(logging.INFO)
+        root.addHandler(worker_handler)
+        return
+
+    file_handler = RotatingFileHandler(os.path.join(log_dir, 'global_debug.log'), maxBytes=Config.LOG_FILE_MAX_BYTES,
+                                       backupCount=Config.LOG_FILE_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    # 用spawn上下文创建：fork上下文的队列不能传给spawn启动的进程池，反之fork启动的子进程可以直接继承
+    _log_queue = multiprocessing.get_context('spawn').Queue()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(_log_queue))
+    _log_listener = QueueListener(_log_queue, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    # 退出前写完队列中剩余的日志
+    atexit.register(_log_listener.stop)
+
+
+def get_log_queue():
+    """主进程的日志队列，创建进程池时作为init_worker_logging的参数传给子进程（子进程中为None）"""
+    return _log_queue
+
+
+def init_worker_logging(log_queue) -> None:
+    """进程池initializer：子进程的日志改为发送到主进程的日志队列，由主进程统一写入和轮转"""
+    if log_queue is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+
+
+setup_logging()
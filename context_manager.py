@@ -0,0 +1,116 @@
+"""
+上下文窗口管理模块 - 按token预算组装发送给模型的消息
+替代固定条数的历史截取：历史按轮次从新到旧装入预算，超大的工具结果先压缩再送入模型
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩字符约1个token/字，其余字符约4个字符/token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if ch >= '⺀')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class ContextWindowManager:
+    """上下文窗口管理器"""
+
+    # 每条消息的角色、分隔符等固定开销
+    MESSAGE_OVERHEAD_TOKENS = 4
+
+    def __init__(self, token_budget: int = 6000, tool_result_token_limit: int = 1500,
+                 estimator: Optional[Callable[[str], int]] = None):
+        """
+        Args:
+            token_budget: 一次请求的上下文总预算（系统提示词+历史+当前消息）
+            tool_result_token_limit: 单个工具结果送入模型前的token上限
+            estimator: token估算函数，接收文本返回token数，默认使用estimate_tokens
+        """
+        self.token_budget = token_budget
+        self.tool_result_token_limit = tool_result_token_limit
+        self.estimator = estimator or estimate_tokens
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """估算单条消息的token数"""
+        return self.estimator(message.get("content") or "") + self.MESSAGE_OVERHEAD_TOKENS
+
+    def truncate_text(self, text: str, max_tokens: int) -> str:
+        """按token上限截断文本，保留开头和结尾"""
+        if self.estimator(text) <= max_tokens:
+            return text
+        # 按估算比例换算出可保留的字符数，再逐步收紧直到满足预算
+        keep = max(int(len(text) * max_tokens / max(self.estimator(text), 1)), 0)
+        while True:
+            tail_len = keep // 3
+            head = text[:keep - tail_len]
+            tail = text[len(text) - tail_len:] if tail_len else ""
+            truncated = f"{head}\n...[已截断 {len(text) - len(head) - len(tail)} 个字符]...\n{tail}"
+            if keep == 0 or self.estimator(truncated) <= max_tokens:
+                return truncated
+            keep = keep * 3 // 4
+
+    def build_messages(self, system_prompt: str, history: List[Dict[str, str]],
+                       user_message: str) -> List[Dict[str, str]]:
+        """组装消息：系统提示词 + 预算内的最近若干轮历史 + 当前用户消息
+
+        历史以“用户消息开头的一轮”为单位从新到旧装入，装不下时停止，
+        保证窗口不会从助手消息开始，也不会跳过中间的轮次。
+        """
+        system_message = {"role": "system", "content": system_prompt}
+        remaining = self.token_budget - self.count_message(system_message)
+
+        # 当前消息必须保留，过大时截断（例如直接粘贴的整段日志）
+        user_limit = max(remaining - self.MESSAGE_OVERHEAD_TOKENS, 0)
+        user_entry = {"role": "user", "content": self.truncate_text(user_message, user_limit)}
+        remaining -= self.count_message(user_entry)
+
+        selected: List[Dict[str, str]] = []
+        turn: List[Dict[str, str]] = []
+        turn_tokens = 0
+        for message in reversed(history):
+            turn.append(message)
+            turn_tokens += self.count_message(message)
+            if message.get("role") != "user":
+                continue
+            # 凑齐一轮（从用户消息开始）
+            if turn_tokens > remaining:
+                break
+            remaining -= turn_tokens
+            selected.extend(turn)
+            turn, turn_tokens = [], 0
+
+        selected.reverse()
+        return [system_message, *selected, user_entry]
+
+    def compact_tool_result(self, tool_result: Any) -> str:
+        """将工具结果序列化为JSON，超出上限时逐步压缩列表和长字符串"""
+        text = json.dumps(tool_result, ensure_ascii=False)
+        if self.estimator(text) <= self.tool_result_token_limit:
+            return text
+
+        max_items, max_chars = 20, 500
+        while max_items > 1 or max_chars > 50:
+            compacted = self._shrink(tool_result, max_items, max_chars)
+            text = json.dumps(compacted, ensure_ascii=False)
+            if self.estimator(text) <= self.tool_result_token_limit:
+                return text
+            max_items = max(max_items // 2, 1)
+            max_chars = max(max_chars // 2, 50)
+
+        return self.truncate_text(text, self.tool_result_token_limit)
+
+    def _shrink(self, value: Any, max_items: int, max_chars: int) -> Any:
+        """递归压缩：列表只保留前max_items项，字符串只保留前max_chars个字符"""
+        if isinstance(value, dict):
+            return {k: self._shrink(v, max_items, max_chars) for k, v in value.items()}
+        if isinstance(value, list):
+            items = [self._shrink(v, max_items, max_chars) for v in value[:max_items]]
+            if len(value) > max_items:
+                items.append(f"...[省略 {len(value) - max_items} 项]")
+            return items
+        if isinstance(value, str) and len(value) > max_chars:
+            return value[:max_chars] + f"...[截断 {len(value) - max_chars} 字符]"
+        return value
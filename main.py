@@ -7,7 +7,7 @@ import sys
 import argparse
 from config import config
 from tool_registry import ToolRegistry
-from agent_core import AgentCore
+from agent_core import AgentCore, create_http_session
 
 # import base_init
 from colorama import init as colorama_init, Fore, Style
@@ -21,16 +21,19 @@ def initialize_agent(check_ollama=True) -> AgentCore:
     try:
         import pytz
         import yaml
-        import requests
     except ImportError as e:
         print(f"❌ 缺少依赖包: {e}")
         print("请运行: pip install requests pyyaml pytz")
         sys.exit(1)
     
+    # 创建Ollama连接池会话（健康检查与模型调用共用）
+    http_session = create_http_session(config)
+    
     # 检查Ollama服务
     if check_ollama:
         try:
-            response = requests.get(f"{config.OLLAMA_API_BASE}/tags", timeout=5)
+            response = http_session.get(f"{config.OLLAMA_API_BASE}/tags",
+                                        timeout=(config.OLLAMA_CONNECT_TIMEOUT, 5))
             if response.status_code != 200:
                 print("❌ Ollama服务可能未运行或无法访问")
                 print("请确保已启动Ollama: ollama serve")
@@ -50,14 +53,17 @@ def initialize_agent(check_ollama=True) -> AgentCore:
     
     # 初始化智能体核心
     try:
-        agent = AgentCore(config, tool_registry)
+        agent = AgentCore(config, tool_registry, http_session=http_session)
+        # 后台预热模型，避免首个请求承担模型加载耗时
+        if check_ollama and config.MODEL_WARMUP_ENABLED:
+            agent.start_model_warmer()
     except Exception as e:
         print(f"❌ 初始化智能体核心失败: {e}")
         sys.exit(1)
     
     print("✅ 智能体初始化完成!")
     print(f"📊 使用模型: {config.MODEL_NAME}")
-    print(f"🛠️  可用工具: {', '.join(tool_registry.implementations.keys())}")
+    print(f"🛠️  可用工具: {', '.join(tool_registry.list_tools())}")
     
     return agent
 
@@ -129,7 +135,7 @@ def main():
         if args.test_tools:
             agent = initialize_agent(check_ollama=False)
             print("\n🛠️  可用工具列表:")
-            for i, (tool_name, tool_func) in enumerate(agent.tool_registry.implementations.items(), 1):
+            for i, tool_name in enumerate(agent.tool_registry.list_tools(), 1):
                 tool_def = agent.tool_registry.tools.get(tool_name, {})
                 description = tool_def.get('description', '无描述')
                 print(f"  {i}. {tool_name}: {description}")
@@ -140,7 +146,7 @@ def main():
         # 如果指定了列出工具，显示后退出
         if args.list_tools:
             print("\n🛠️  可用工具列表:")
-            for i, (tool_name, tool_func) in enumerate(agent.tool_registry.implementations.items(), 1):
+            for i, tool_name in enumerate(agent.tool_registry.list_tools(), 1):
                 tool_def = agent.tool_registry.tools.get(tool_name, {})
                 description = tool_def.get('description', '无描述')
                 print(f"  {i}. {tool_name}: {description}")
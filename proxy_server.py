@@ -175,6 +175,10 @@ async def reverse_proxy(request):
                 params=request.query,
                 allow_redirects=False
             ) as response:
+                # 流式响应（SSE）：边收边转发，避免整包缓冲
+                if response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                    return await handle_stream_proxy(request, response)
+                
                 # 构建响应（添加跨域头）
                 proxy_response = web.Response(
                     status=response.status,
@@ -194,6 +198,20 @@ async def reverse_proxy(request):
             content_type="text/plain"
         )
 
+async def handle_stream_proxy(request, response):
+    """流式响应代理：逐块转发后端的Server-Sent Events"""
+    stream_response = web.StreamResponse(status=response.status)
+    stream_response.headers['Content-Type'] = response.headers.get('Content-Type', 'text/event-stream')
+    stream_response.headers['Cache-Control'] = 'no-cache'
+    stream_response.headers['Access-Control-Allow-Origin'] = '*'
+    await stream_response.prepare(request)
+    
+    async for chunk in response.content.iter_any():
+        await stream_response.write(chunk)
+    
+    await stream_response.write_eof()
+    return stream_response
+
 async def handle_websocket_proxy(request, target_host, target_path):
     """WebSocket代理适配"""
     ws_target_url = target_host.replace("http://", "ws://") + target_path
@@ -0,0 +1,107 @@
+"""
+结果缓存模块 - 进程内LRU缓存，按条目数和估算内存双重上限淘汰，条目可设置过期时间
+用于缓存可由输入唯一确定的计算结果（如同一日志文件的分析结果），命中时直接返回
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算对象占用的内存（字节）：递归累加容器和其中元素的sys.getsizeof"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class ResultCache:
+    """LRU结果缓存：超过条目数或内存上限时淘汰最久未使用的结果，过期的结果在读取时删除"""
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024,
+                 sizer: Optional[Callable[[Any], int]] = None):
+        """
+        Args:
+            max_entries: 最多缓存的结果数
+            max_bytes: 所有结果估算内存的总上限，单个结果超过该值时不缓存
+            sizer: 估算结果大小的函数，默认使用estimate_size
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizer = sizer or estimate_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size, 过期时间或None)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，命中时把结果移到LRU队尾"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove_locked(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None, ttl: Optional[float] = None) -> bool:
+        """写入缓存，返回是否已缓存（超过内存上限的单个结果不缓存）；ttl为过期秒数，None表示不过期"""
+        size = self.sizer(value) if size is None else size
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._remove_locked(key)
+            if size > self.max_bytes or self.max_entries <= 0:
+                return False
+            self._entries[key] = (value, size, expires_at)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除指定结果"""
+        with self._lock:
+            self._remove_locked(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove_locked(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
@@ -0,0 +1,126 @@
+"""
+会话管理模块 - 为每个浏览器会话维护独立的对话状态
+所有会话共享同一个AgentCore（工具注册表、系统提示词、连接池），只隔离对话历史
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+
+class ConversationSession:
+    """单个会话的对话状态"""
+
+    __slots__ = ("session_id", "history", "lock", "created_at", "last_access", "size_bytes")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.history: List[Dict[str, str]] = []
+        # 同一会话的请求串行处理，不同会话之间互不阻塞
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.size_bytes = 0
+
+    def refresh_size(self) -> int:
+        """重新估算对话历史占用的内存（字节）"""
+        self.size_bytes = sum(sys.getsizeof(m.get("content", "")) for m in self.history)
+        return self.size_bytes
+
+
+class SessionManager:
+    """会话管理器：按会话ID保存对话状态，支持LRU/TTL淘汰和内存上限"""
+
+    def __init__(self, max_sessions: int = 200, ttl_seconds: float = 3600,
+                 max_memory_bytes: int = 64 * 1024 * 1024, max_history_messages: int = 40):
+        """
+        Args:
+            max_sessions: 最多保留的会话数，超出时淘汰最久未访问的会话
+            ttl_seconds: 会话空闲超过该时长后被淘汰
+            max_memory_bytes: 所有会话对话历史的总内存上限
+            max_history_messages: 单个会话最多保留的历史消息条数
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.max_history_messages = max_history_messages
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: str) -> ConversationSession:
+        """获取会话，不存在则创建；访问会把会话移到LRU队尾"""
+        now = time.time()
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is not None and now - conversation.last_access > self.ttl_seconds:
+                self._remove_locked(session_id)
+                conversation = None
+
+            if conversation is None:
+                conversation = ConversationSession(session_id)
+                self._sessions[session_id] = conversation
+            else:
+                self._sessions.move_to_end(session_id)
+
+            conversation.last_access = now
+            self._evict_locked(now, keep=session_id)
+            return conversation
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        """获取已存在的会话（不创建）"""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id: str) -> None:
+        """删除会话"""
+        with self._lock:
+            self._remove_locked(session_id)
+
+    def commit(self, conversation: ConversationSession) -> None:
+        """一轮对话结束后调用：裁剪历史、更新内存占用并按需淘汰"""
+        # 只丢弃成对的最早消息，保证历史始终从用户消息开始
+        overflow = len(conversation.history) - self.max_history_messages
+        if overflow > 0:
+            del conversation.history[:overflow + overflow % 2]
+
+        with self._lock:
+            old_size = conversation.size_bytes
+            new_size = conversation.refresh_size()
+            if self._sessions.get(conversation.session_id) is conversation:
+                self._total_bytes += new_size - old_size
+            self._evict_locked(time.time(), keep=conversation.session_id)
+
+    def _remove_locked(self, session_id: str) -> None:
+        conversation = self._sessions.pop(session_id, None)
+        if conversation is not None:
+            self._total_bytes -= conversation.size_bytes
+
+    def _evict_locked(self, now: float, keep: Optional[str] = None) -> None:
+        """淘汰过期会话，再按LRU顺序淘汰超出数量/内存上限的会话"""
+        expired = [sid for sid, conv in self._sessions.items()
+                   if now - conv.last_access > self.ttl_seconds and sid != keep]
+        for sid in expired:
+            self._remove_locked(sid)
+
+        while len(self._sessions) > self.max_sessions or self._total_bytes > self.max_memory_bytes:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                if len(self._sessions) == 1:
+                    break
+                # 当前会话不淘汰，从次旧的开始
+                self._sessions.move_to_end(keep)
+                continue
+            self._remove_locked(oldest)
+
+    def stats(self) -> Dict[str, Any]:
+        """会话统计信息"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": self._total_bytes,
+                "max_sessions": self.max_sessions,
+                "max_memory_bytes": self.max_memory_bytes
+            }
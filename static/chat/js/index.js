@@ -274,28 +274,7 @@ function sendMessage() {
         sendButton.disabled = true;
         sendButton.textContent = '发送中...';
 
-        fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ 
-                message: message
-            })
-        })
-        .then(response => response.json())
-        .then(data => {
-            // 添加助手回复到界面
-            addAIMessage(data.response);
-            
-            // 检查是否有终端命令需要执行
-            if (data.terminal_commands && data.terminal_commands.length > 0) {
-                console.log('收到终端命令:', data.terminal_commands);
-                
-                // 依次执行终端命令
-                executeTerminalCommands(data.terminal_commands);
-            }
-        })
+        streamChat(message)
         .catch(error => {
             console.error('Error:', error);
             addAIMessage('抱歉，处理请求时出错了。');
@@ -313,6 +292,119 @@ function sendMessage() {
 
 
 
+// --- 2.4 流式对话 ---
+//  创建一个空的AI消息胶囊，返回用于追加文本的元素
+function createStreamingAIMessage() {
+    const messageContainer = document.createElement('div');
+    messageContainer.className = 'message-container';
+    const aiMsg = document.createElement('div');
+    aiMsg.className = 'ai-msg';
+    aiMsg.style.whiteSpace = 'pre-wrap';
+    messageContainer.appendChild(aiMsg);
+    chatMain.appendChild(messageContainer);
+    scrollToBottom();
+    return aiMsg;
+}
+
+//  处理一条SSE事件
+function handleStreamEvent(event, aiMsg) {
+    if (event.type === 'delta') {
+        aiMsg.textContent += event.content;
+        scrollToBottom();
+    } else if (event.type === 'tool_call') {
+        // 此前的增量是工具调用指令，替换为调用提示
+        aiMsg.textContent = `正在调用工具 ${event.name}...\n\n`;
+    } else if (event.type === 'done') {
+        // 最终回复与非流式接口一样用addAIMessage渲染，替换流式阶段的纯文本胶囊
+        aiMsg.parentElement.remove();
+        addAIMessage(event.response);
+
+        // 检查是否有终端命令需要执行
+        if (event.terminal_commands && event.terminal_commands.length > 0) {
+            console.log('收到终端命令:', event.terminal_commands);
+            executeTerminalCommands(event.terminal_commands);
+        }
+    } else if (event.type === 'error') {
+        aiMsg.textContent = `抱歉，处理请求时出错了：${event.error}`;
+    }
+}
+
+//  调用流式接口，逐段渲染AI回复；浏览器不支持流式读取时回退到普通接口
+async function streamChat(message) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            message: message
+        })
+    });
+
+    if (!response.ok) {
+        // 服务端已经处理过这条消息（参数错误或执行出错），显示错误，不再用普通接口重发
+        const data = await response.json().catch(() => ({}));
+        addAIMessage(`抱歉，处理请求时出错了：${escapeHtml(data.error || `HTTP ${response.status}`)}`);
+        return;
+    }
+    if (!response.body) {
+        // 浏览器不支持流式读取
+        return fallbackChat(message);
+    }
+
+    const aiMsg = createStreamingAIMessage();
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE事件以空行分隔
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            const dataLines = rawEvent.split('\n')
+                .filter(line => line.startsWith('data:'))
+                .map(line => line.slice(5).trimStart());
+            if (dataLines.length === 0) continue;
+
+            handleStreamEvent(JSON.parse(dataLines.join('\n')), aiMsg);
+        }
+    }
+}
+
+//  非流式接口
+function fallbackChat(message) {
+    return fetch('/api/chat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ 
+            message: message
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        // 添加助手回复到界面
+        addAIMessage(data.response);
+        
+        // 检查是否有终端命令需要执行
+        if (data.terminal_commands && data.terminal_commands.length > 0) {
+            console.log('收到终端命令:', data.terminal_commands);
+            
+            // 依次执行终端命令
+            executeTerminalCommands(data.terminal_commands);
+        }
+    });
+}
+
 // --- 新增：渲染AI文档的函数 ---
 function renderAIDocument(content) {
     const docContent = document.querySelector('.document-content');
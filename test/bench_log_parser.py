@@ -0,0 +1,74 @@
+"""
+GeoServer日志解析基准：
+1. 对比预筛选开启/关闭时的解析速度（行/秒）
+2. 对比解析记录保存为字典列表与列式存储（LogRecordStore）的内存占用
+用法：python test/bench_log_parser.py [日志文件路径] [重复次数]
+"""
+
+import os
+import sys
+import gc
+import time
+import logging
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.implementations.log_analysis_tools import GeoServerLogParser, LogRecordStore
+
+logging.disable(logging.CRITICAL)
+
+
+def bench(lines, prefilter, repeat):
+    """多次解析同一组日志行，返回（最快一次耗时，产出记录数）"""
+    best, records = None, 0
+    for _ in range(repeat):
+        parser = GeoServerLogParser(prefilter=prefilter)
+        start = time.perf_counter()
+        records = sum(1 for _ in parser.iter_records(lines))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, records
+
+
+def measure_memory(build):
+    """返回build()结果保留的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def collect_store(log_file_path):
+    store = LogRecordStore()
+    for record in GeoServerLogParser().iter_file(log_file_path):
+        store.append(record)
+    return store
+
+
+if __name__ == "__main__":
+    default_log = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "geoserver.log.1")
+    log_file_path = sys.argv[1] if len(sys.argv) > 1 else default_log
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    # 先读入内存，只测解析本身
+    lines = list(GeoServerLogParser.read_lines(log_file_path))
+    print(f"日志文件: {log_file_path}（{len(lines)} 行，取{repeat}次中最快的一次）")
+
+    results = {}
+    for label, prefilter in (("无预筛选", False), ("分级预筛选", True)):
+        elapsed, records = bench(lines, prefilter, repeat)
+        results[label] = elapsed
+        print(f"{label:<8} {elapsed * 1000:8.1f} ms  {len(lines) / elapsed:12,.0f} 行/秒  记录数: {records}")
+
+    print(f"加速比: {results['无预筛选'] / results['分级预筛选']:.2f}x")
+
+    dict_bytes = measure_memory(lambda: list(GeoServerLogParser().iter_file(log_file_path)))
+    store_bytes = measure_memory(lambda: collect_store(log_file_path))
+    print(f"字典列表 {dict_bytes / 1024:10,.1f} KB")
+    print(f"列式存储 {store_bytes / 1024:10,.1f} KB")
+    print(f"内存缩减: {dict_bytes / store_bytes:.1f}x")
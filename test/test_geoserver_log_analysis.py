@@ -0,0 +1,219 @@
+"""
+GeoServer日志分析的行为测试（使用仓库自带的geoserver.log.1）：
+1. 统计结果：有效请求数、威胁数
+2. 并行解析（含跨块的请求/耗时日志配对）与顺序解析结果一致
+3. PATTERN_GEOSERVER_CORE匹配紧跟在URI后的耗时日志，请求与耗时日志能配对
+4. 分页游标、每页条数的边界情况
+5. 日志轮转时尚未配对的请求（跟踪模式、日志索引）仍使用自己的原始日志
+用法：python -m pytest test/test_geoserver_log_analysis.py
+"""
+
+import os
+import sys
+import logging
+import importlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_from_root(*module_names):
+    """
+    从仓库根目录导入被测模块（连同根目录的config一起，返回模块元组）
+    test目录下另有同名的config.py（test_log.py使用），导入期间让根目录的config优先，
+    导入完成后恢复sys.modules中原来的config，不影响同一次运行中的其他测试文件
+    """
+    previous = sys.modules.pop("config", None)
+    sys.path.insert(0, ROOT)
+    try:
+        return tuple(importlib.import_module(name) for name in ("config",) + module_names)
+    finally:
+        sys.path.remove(ROOT)
+        if previous is None:
+            sys.modules.pop("config", None)
+        else:
+            sys.modules["config"] = previous
+
+
+_root_config, log_analysis_tools, log_index = _import_from_root(
+    "tools.implementations.log_analysis_tools", "tools.implementations.log_index"
+)
+config = _root_config.config
+PATTERN_GEOSERVER_CORE = log_analysis_tools.PATTERN_GEOSERVER_CORE
+GeoServerLogParser = log_analysis_tools.GeoServerLogParser
+LogAnalysisTools = log_analysis_tools.LogAnalysisTools
+LogFollower = log_analysis_tools.LogFollower
+build_threat_report = log_analysis_tools.build_threat_report
+GeoServerLogIndex = log_index.GeoServerLogIndex
+
+logging.disable(logging.CRITICAL)
+
+LOG_FILE_PATH = os.path.join(ROOT, "geoserver.log.1")
+
+
+def threat_keys(report):
+    """威胁条目的比较键（并行解析时威胁按区间排列，比较前排序）"""
+    return sorted(
+        (item["timestamp"], item["client_ip"], item["full_raw_log"], tuple(item["threat_details"]))
+        for item in report.build()["threat_details"]
+    )
+
+
+@pytest.fixture(scope="module")
+def sequential_report():
+    return build_threat_report([LOG_FILE_PATH], workers=1)
+
+
+def test_bundled_log_summary(sequential_report):
+    summary = sequential_report.summary()
+    assert summary["total_processed_lines"] == 12094
+    assert summary["total_valid_requests"] == 339
+    assert summary["total_threat_requests"] == 47
+
+
+@pytest.mark.parametrize("chunk_bytes", [64 * 1024, 256 * 1024])
+def test_parallel_matches_sequential(monkeypatch, sequential_report, chunk_bytes):
+    # 调小阈值，让自带的小日志也切成多块并行解析，覆盖跨块配对
+    monkeypatch.setattr(config, "LOG_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(config, "LOG_PARALLEL_CHUNK_MIN_BYTES", chunk_bytes)
+    # 进程池（spawn）按模块名传递initializer和任务函数，子进程重新导入被测模块：
+    # 测试期间config指向根目录的模块，根目录排在test目录之前
+    monkeypatch.setitem(sys.modules, "config", _root_config)
+    monkeypatch.syspath_prepend(ROOT)
+    parallel_report = build_threat_report([LOG_FILE_PATH], workers=4)
+    assert parallel_report.summary() == sequential_report.summary()
+    assert threat_keys(parallel_report) == threat_keys(sequential_report)
+
+
+REQUEST_LINE = ('<133>Feb  5 13:48:25 localhost geoserver: 04 2月 21:49:45 INFO   [geoserver.filters] - '
+                '10.0.0.5 "GET /geoserver/www/nanning.json" "Mozilla/5.0" "http://172.16.37.20/" "" ')
+TOOK_LINE = ('<133>Feb  5 13:48:25 localhost geoserver: 04 2月 21:49:45 INFO   [geoserver.filters] - '
+             '10.0.0.5 "GET /geoserver/www/nanning.json" took 202ms')
+
+
+def test_core_pattern_matches_took_line():
+    # 没有User-Agent时URI后只有一个空格，referer前的空白必须可选
+    match = PATTERN_GEOSERVER_CORE.search(TOOK_LINE)
+    assert match is not None
+    assert match.group("client_ip") == "10.0.0.5"
+    assert match.group("request_uri") == "/geoserver/www/nanning.json"
+
+
+def test_request_paired_with_took_line():
+    records = list(GeoServerLogParser().iter_records([REQUEST_LINE, TOOK_LINE]))
+    assert len(records) == 1
+    assert records[0]["response_time_ms"] == 202
+    assert records[0]["referer"] == "http://172.16.37.20/"
+
+
+def test_pages_cover_all_threats_once(sequential_report):
+    first = sequential_report.build_page(limit=1, max_bytes=0)
+    total = first["page"]["total_items"]
+    seen, page = [], first
+    while True:
+        seen.extend((item["client_ip"], tuple(item["threat_details"])) for item in page["threat_details"])
+        if page["page"]["next_cursor"] is None:
+            break
+        page = sequential_report.build_page(limit=1, cursor=page["page"]["next_cursor"], max_bytes=0)
+    assert len(seen) == len(set(seen)) == total
+    assert sum(item["occurrences"] for item in
+               sequential_report.build_page(limit=total, max_bytes=0)["threat_details"]) == 47
+
+
+def test_page_past_end_is_empty(sequential_report):
+    page = sequential_report.build_page(cursor="1000")
+    assert page["threat_details"] == []
+    assert page["page"]["next_cursor"] is None
+
+
+def test_byte_budget_returns_at_least_one_item(sequential_report):
+    page = sequential_report.build_page(limit=10, max_bytes=1, dedupe=False)
+    assert page["page"]["returned"] == 1
+    assert page["page"]["next_cursor"] == "1"
+
+
+@pytest.mark.parametrize("cursor", ["-1", "abc", "1.5"])
+def test_invalid_cursor_rejected(sequential_report, cursor):
+    with pytest.raises(ValueError):
+        sequential_report.build_page(cursor=cursor)
+
+
+@pytest.mark.parametrize("limit", [0, -5, "x"])
+def test_invalid_limit_rejected(sequential_report, limit):
+    with pytest.raises(ValueError):
+        sequential_report.build_page(limit=limit)
+
+
+def test_tool_returns_error_result_for_invalid_cursor():
+    result = LogAnalysisTools.analyze_geoserver_log(log_file_path=LOG_FILE_PATH, cursor="-1")
+    assert "error" in result
+
+
+LINE_PREFIX = '<133>Feb  5 13:48:25 localhost geoserver: 05 2月 11:04:{second:02d} INFO   [geoserver.filters] - '
+THREAT_QUERY = ("service=WFS&version=2.0.0&request=GetPropertyValue&typeNames=topp%3Astates"
+                "&valueReference=exec(java.lang.Runtime.getRuntime()%2C'./shell')")
+THREAT_REQUEST = '192.168.1.21 "GET /geoserver/topp/wfs?' + THREAT_QUERY + '"'
+
+
+def write_rotating_log(log_path):
+    """
+    写入以尚未等到耗时日志的威胁请求结尾的日志，返回轮转函数：
+    原文件重命名为.1，新文件开头是其他请求（原偏移处是另一行），随后才是这条请求的耗时日志
+    """
+    filler = [LINE_PREFIX.format(second=1) + f'10.0.0.7 "GET /geoserver/wfs?filler={i}" "Mozilla/5.0" "" ""'
+              for i in range(20)]
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(filler[:5] + [LINE_PREFIX.format(second=2) + THREAT_REQUEST + ' "python-requests/2.32.5" "" ""']) + "\n")
+
+    def rotate():
+        os.replace(log_path, log_path + ".1")
+        with open(log_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(filler + [LINE_PREFIX.format(second=3) + THREAT_REQUEST + " took 31ms"]) + "\n")
+
+    return rotate
+
+
+def test_follow_keeps_raw_log_of_request_pending_across_rotation(tmp_path):
+    log_path = str(tmp_path / "geoserver.log")
+    rotate = write_rotating_log(log_path)
+    follower = LogFollower(str(tmp_path / "follow_state"))
+
+    pending_report, _ = follower.follow(log_path)
+    assert [item["query_string"] for item in pending_report.build()["threat_details"]] == [THREAT_QUERY]
+
+    rotate()
+    report, info = follower.follow(log_path)
+    assert info["event"] == "rotated"
+    threats = report.build()["threat_details"]
+    assert [item["query_string"] for item in threats] == [THREAT_QUERY]
+    assert THREAT_REQUEST in threats[0]["full_raw_log"]
+
+
+def test_index_keeps_raw_log_of_request_pending_across_rotation(tmp_path):
+    log_path = str(tmp_path / "geoserver.log")
+    rotate = write_rotating_log(log_path)
+    index = GeoServerLogIndex(str(tmp_path / "index.db"))
+
+    index.update(log_path)
+    rotate()
+    assert index.update(log_path)["event"] == "rotated"
+    threats = index.query(log_path, threats_only=True)["results"]
+    assert [(item["query_string"], item["response_time_ms"], item["pending"]) for item in threats] == [
+        (THREAT_QUERY, 31, False)
+    ]
+
+
+def test_follow_keeps_pending_threats_out_of_the_cached_store(tmp_path):
+    log_path = str(tmp_path / "geoserver.log")
+    write_rotating_log(log_path)
+    follower = LogFollower(str(tmp_path / "follow_state"))
+
+    first, _ = follower.follow(log_path)
+    second, _ = follower.follow(log_path)
+    # 未配对的威胁单独存放：两次结果共用同一个已落盘威胁的缓存，没有整体复制
+    cached, pending = first.threats.stores
+    assert second.threats.stores[0] is cached
+    assert (len(cached), len(pending)) == (0, 1)
+    assert os.path.getsize(follower._threats_path(log_path)) == 0
+    assert first.summary()["total_threat_requests"] == second.summary()["total_threat_requests"] == 1
@@ -0,0 +1,233 @@
+"""
+工具执行层 - 按工具定义中的execution字段为每个工具设置执行策略
+- timeout: 超时秒数，超时后调用方不再等待，返回结构化错误
+- max_concurrency: 同时执行的上限；concurrency_group相同的工具共用一个上限
+  并发已满时最多等待TOOL_SLOT_WAIT_SECONDS秒，仍无空闲名额则返回错误
+- executor: thread（默认）在线程池中执行；process 在独立的进程池中执行CPU密集型工具，不占用主进程的GIL
+  工具内部已经自行分派到进程池、或依赖进程内缓存的工具（如GeoServer日志分析）应使用thread，
+  否则会出现嵌套进程池，缓存也会分散到各个子进程中
+工具总是在工作线程/进程中执行，调用方（Flask请求线程、智能体线程）最多等待timeout秒
+"""
+
+import inspect
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from config import get_log_queue, init_worker_logging
+
+
+def resolve_target(target: str) -> Callable:
+    """按 "模块:类.方法" 导入工具实现"""
+    module_name, _, attribute = target.partition(':')
+    obj = importlib.import_module(module_name)
+    for part in attribute.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def run_tool_in_process(target: str, kwargs: Dict[str, Any]) -> Any:
+    """进程池中执行工具的入口：在子进程中按清单导入工具再调用（工具函数本身不需要可pickle）"""
+    return resolve_target(target)(**kwargs)
+
+
+class ToolExecutionError(Exception):
+    """工具调用在执行前被拒绝（参数无效、并发已满）或等待超时"""
+
+    def __init__(self, code: str, tool_name: str, message: str, **details):
+        super().__init__(message)
+        self.code = code
+        self.tool_name = tool_name
+        self.details = details
+
+    def to_result(self) -> Dict[str, Any]:
+        """返回给模型的结构化错误"""
+        return {"error": str(self), "error_code": self.code, "tool": self.tool_name, **self.details}
+
+
+class ToolExecutionPolicy:
+    """单个工具的执行策略"""
+
+    EXECUTORS = ("thread", "process")
+
+    __slots__ = ("timeout", "max_concurrency", "group", "executor")
+
+    def __init__(self, timeout: float, max_concurrency: int, group: str, executor: str = "thread"):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.group = group
+        self.executor = executor
+
+    @classmethod
+    def from_definition(cls, tool_name: str, tool_def: Dict[str, Any], config) -> "ToolExecutionPolicy":
+        """从工具定义的execution字段生成策略，未填写的项使用配置中的默认值"""
+        execution = tool_def.get("execution") or {}
+        executor = execution.get("executor", "thread")
+        if executor not in cls.EXECUTORS:
+            raise ValueError(f"工具 {tool_name} 的executor无效: {executor}，可选: {', '.join(cls.EXECUTORS)}")
+        return cls(
+            timeout=float(execution.get("timeout", config.TOOL_DEFAULT_TIMEOUT)),
+            max_concurrency=max(1, int(execution.get("max_concurrency", config.TOOL_DEFAULT_MAX_CONCURRENCY))),
+            group=execution.get("concurrency_group") or tool_name,
+            executor=executor
+        )
+
+
+class ToolExecutor:
+    """
+    按策略执行工具：
+    1. 占用工具（组）的并发名额，工具真正结束时才释放——超时后仍在运行的工具继续占用名额，
+       卡住的工具最多占用max_concurrency个工作线程，不会拖垮其他工具
+    2. 同步工具提交到线程池或进程池，异步工具提交到注册表的常驻事件循环
+    3. 调用方按timeout等待结果；超时的异步工具和未开始的任务会被取消，
+       已在运行的线程/进程无法强制中断，结果被丢弃
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.policies: Dict[str, ToolExecutionPolicy] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def configure(self, tools: Dict[str, Dict[str, Any]]) -> None:
+        """根据工具定义生成执行策略，同组工具的并发上限取组内最小值"""
+        policies, limits = {}, {}
+        for tool_name, tool_def in tools.items():
+            try:
+                policy = ToolExecutionPolicy.from_definition(tool_name, tool_def, self.config)
+            except (ValueError, TypeError) as e:
+                print(f"工具执行策略无效，使用默认策略: {e}")
+                policy = ToolExecutionPolicy.from_definition(tool_name, {}, self.config)
+            policies[tool_name] = policy
+            limits[policy.group] = min(limits.get(policy.group, policy.max_concurrency), policy.max_concurrency)
+        with self._lock:
+            self.policies = policies
+            self._slots = {group: threading.BoundedSemaphore(limit) for group, limit in limits.items()}
+
+    def policy(self, tool_name: str) -> ToolExecutionPolicy:
+        """获取工具的执行策略（没有定义的工具使用默认策略）"""
+        policy = self.policies.get(tool_name)
+        if policy is None:
+            with self._lock:
+                policy = self.policies.get(tool_name)
+                if policy is None:
+                    policy = ToolExecutionPolicy.from_definition(tool_name, {}, self.config)
+                    self.policies[tool_name] = policy
+        return policy
+
+    def acquire(self, tool_name: str, wait: bool = True) -> Callable[[], None]:
+        """占用工具的一个并发名额，返回释放函数；没有空闲名额时抛出TOOL_BUSY"""
+        policy = self.policy(tool_name)
+        with self._lock:
+            slot = self._slots.get(policy.group)
+            if slot is None:
+                slot = self._slots[policy.group] = threading.BoundedSemaphore(policy.max_concurrency)
+
+        acquired = slot.acquire(timeout=self.config.TOOL_SLOT_WAIT_SECONDS) if wait else slot.acquire(blocking=False)
+        if not acquired:
+            raise ToolExecutionError(
+                "TOOL_BUSY", tool_name,
+                f"工具 {tool_name} 同时执行的调用数已达上限（{policy.max_concurrency}），请稍后重试",
+                max_concurrency=policy.max_concurrency
+            )
+        return slot.release
+
+    def timeout_error(self, tool_name: str) -> ToolExecutionError:
+        timeout = self.policy(tool_name).timeout
+        return ToolExecutionError(
+            "TOOL_TIMEOUT", tool_name,
+            f"工具 {tool_name} 执行超时（超过{timeout:g}秒），已停止等待结果",
+            timeout_seconds=timeout
+        )
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.config.TOOL_THREAD_WORKERS,
+                    thread_name_prefix="tool-worker"
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                # spawn启动：主进程有事件循环、日志等后台线程，fork可能复制到持有中的锁
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.config.TOOL_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    # 子进程的日志发送到主进程的日志队列，不直接打开global_debug.log
+                    initializer=init_worker_logging,
+                    initargs=(get_log_queue(),)
+                )
+            return self._process_pool
+
+    def _reset_process_pool(self, pool: ProcessPoolExecutor) -> None:
+        """子进程异常退出后丢弃进程池，下次使用时重建"""
+        with self._lock:
+            if self._process_pool is pool:
+                self._process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_process(self, target: str, kwargs: Dict[str, Any]) -> Future:
+        pool = self._get_process_pool()
+        try:
+            future = pool.submit(run_tool_in_process, target, kwargs)
+        except BrokenProcessPool:
+            self._reset_process_pool(pool)
+            pool = self._get_process_pool()
+            future = pool.submit(run_tool_in_process, target, kwargs)
+
+        def check_pool(done: Future) -> None:
+            if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                self._reset_process_pool(pool)
+
+        future.add_done_callback(check_pool)
+        return future
+
+    def submit(self, tool_name: str, tool_func: Callable, kwargs: Dict[str, Any], target: Optional[str] = None,
+               submit_coroutine: Optional[Callable[[Any], Future]] = None) -> Future:
+        """
+        按策略提交工具，返回Future
+        target为工具在清单中的 "模块:类.方法"，进程池执行时用它在子进程中导入工具；没有target时退回线程池
+        """
+        policy = self.policy(tool_name)
+        release = self.acquire(tool_name)
+        try:
+            if inspect.iscoroutinefunction(tool_func):
+                future = submit_coroutine(tool_func(**kwargs))
+            elif policy.executor == "process" and target:
+                future = self._submit_process(target, kwargs)
+            else:
+                future = self._get_thread_pool().submit(tool_func, **kwargs)
+        except BaseException:
+            release()
+            raise
+        future.add_done_callback(lambda _: release())
+        return future
+
+    def result(self, tool_name: str, future: Future) -> Any:
+        """按工具的超时时间等待结果，超时抛出TOOL_TIMEOUT"""
+        try:
+            return future.result(timeout=self.policy(tool_name).timeout)
+        except FutureTimeoutError:
+            # Python 3.11起与内置TimeoutError是同一个类：工具自身抛出的超时（如网络超时）原样抛出
+            if future.done():
+                raise
+            future.cancel()
+            raise self.timeout_error(tool_name)
+
+    def close(self) -> None:
+        """关闭线程池和进程池（不等待运行中的工具），之后再执行工具时重新创建"""
+        with self._lock:
+            pools = (self._thread_pool, self._process_pool)
+            self._thread_pool, self._process_pool = None, None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
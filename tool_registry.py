@@ -1,22 +1,52 @@
+import os
 import json
-import yaml
-import importlib.util
+import glob
+import asyncio
+import inspect
+import pkgutil
+import threading
+import functools
+import logging
+import importlib
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Dict, List, Any, Callable
-import sys
-import time
-import random
+from typing import Dict, List, Any, Callable, Optional
+from tool_execution import ToolExecutor, ToolExecutionError, resolve_target
+from result_cache import ResultCache
+from tool_validation import ParameterValidator
+from tools.implementations.log_decorator import render_value
 
-from colorama import init as colorama_init, Fore, Style
+from colorama import init as colorama_init, Fore
 colorama_init(autoreset=True) # 字体
 
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
 class ToolRegistry:
     """工具注册表，负责加载工具定义和实现"""
     
+    IMPLEMENTATIONS_PACKAGE = "tools.implementations"
+    MANIFEST_VERSION = 1
+    
     def __init__(self, config):
         self.config = config
         self.tools = {}  # 工具定义
-        self.implementations = {}  # 工具实现
+        self.implementations = {}  # 已导入的工具实现
+        self._manifest: Dict[str, str] = {}  # 工具清单：工具名 -> "模块:类.方法"
+        self._ollama_tools = None  # Ollama原生工具调用格式的定义（首次使用时生成）
+        # 异步工具共用的常驻事件循环（后台线程运行，首次执行异步工具时启动）
+        # 工具可以跨调用复用绑定在该循环上的连接池等资源，多个线程提交的协程在同一循环中并发执行
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+        # 按工具定义中的execution策略（超时、并发上限、线程池/进程池）执行工具
+        self.executor = ToolExecutor(config)
+        # 幂等工具的结果缓存（工具定义中的cache字段开启）：键为工具名+规范化后的参数
+        # 命中时直接返回缓存的对象，调用方不应修改工具结果
+        self.result_cache = ResultCache(config.TOOL_RESULT_CACHE_ENTRIES, config.TOOL_RESULT_CACHE_MAX_BYTES)
+        self._signatures: Dict[str, Optional[inspect.Signature]] = {}
+        self.validators: Dict[str, ParameterValidator] = {}  # 加载时由工具定义的parameters预编译
         
     def load_tool_definitions(self) -> None:
         """加载所有工具定义"""
@@ -42,102 +72,372 @@ class ToolRegistry:
                 print(f"加载工具定义文件失败 {json_file}: {e}")
         print(f"====--====")
 
-    def load_tool_implementations(self) -> None:
-        """加载所有工具实现"""
-        import sys
-        from pathlib import Path
-        
-        # 获取项目根目录
-        project_root = Path(__file__).parent.parent
-        
-        # 将项目根目录添加到 sys.path
-        sys.path.insert(0, str(project_root))
-        
+    def _source_mtimes(self) -> Dict[str, int]:
+        """工具实现目录下各模块源码的修改时间（纳秒），任一模块增删改都会使清单失效"""
+        implementations_dir = Path(self.config.TOOLS_IMPLEMENTATIONS_DIR)
+        return {path.name: path.stat().st_mtime_ns for path in sorted(implementations_dir.glob("*.py"))}
+    
+    def _read_manifest(self, sources: Dict[str, int]) -> Optional[Dict[str, str]]:
+        """读取工具清单，源码或工具定义有变化时返回None"""
         try:
-            # 导入 tools.implementations 包
-            import tools.implementations as tools_impl
-            
-            # 从包中获取所有模块
-            import pkgutil
-            import inspect
+            with open(self.config.TOOLS_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(manifest, dict)
+                or manifest.get("version") != self.MANIFEST_VERSION
+                or manifest.get("sources") != sources
+                or manifest.get("tool_names") != sorted(self.tools)):
+            return None
+        return manifest.get("tools")
+    
+    def _write_manifest(self, sources: Dict[str, int], entries: Dict[str, str]) -> None:
+        """保存工具清单（先写临时文件再替换，避免并发启动读到半个文件）"""
+        manifest_path = Path(self.config.TOOLS_MANIFEST_PATH)
+        temp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+        try:
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": self.MANIFEST_VERSION,
+                    "sources": sources,
+                    "tool_names": sorted(self.tools),
+                    "tools": entries
+                }, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, manifest_path)
+        except OSError as e:
+            print(f"保存工具清单失败 {manifest_path}: {e}")
+    
+    def _discover_tools(self) -> Dict[str, str]:
+        """导入全部工具模块，查找已定义工具的实现，返回 {工具名: "模块:类.方法"}"""
+        entries = {}
+        implementations_dir = Path(self.config.TOOLS_IMPLEMENTATIONS_DIR)
+        for _, module_name, is_pkg in pkgutil.iter_modules([str(implementations_dir)]):
+            if is_pkg:
+                continue
+            try:
+                module = importlib.import_module(f"{self.IMPLEMENTATIONS_PACKAGE}.{module_name}")
+            except Exception as e:
+                print(f"加载工具模块失败 {module_name}: {e}")
+                continue
             
-            for _, module_name, is_pkg in pkgutil.iter_modules(tools_impl.__path__):
-                if not is_pkg and module_name != "__pycache__":
-                    try:
-                        module = __import__(f"tools.implementations.{module_name}", fromlist=[""])
-                        
-                        # 查找并注册工具类
-                        for name, obj in inspect.getmembers(module):
-                            if inspect.isclass(obj):
-                                # 检查是否为工具类
-                                for method_name in dir(obj):
-                                    if (not method_name.startswith('_') and 
-                                        method_name in self.tools):
-                                        method = getattr(obj, method_name)
-                                        if callable(method):
-                                            self.implementations[method_name] = method
-                                            
-                                            print(Fore.CYAN + f"已加载工具实现: {method_name}")
-                                            # time.sleep(random.uniform(0.2, 1))
-                                            
-                    except Exception as e:
-                        print(f"加载工具模块失败 {module_name}: {e}")
-                        
+            # 只检查模块自身定义的类，其他模块导入的类在其定义模块中登记
+            for obj in vars(module).values():
+                if not inspect.isclass(obj) or obj.__module__ != module.__name__:
+                    continue
+                for method_name in dir(obj):
+                    if not method_name.startswith('_') and method_name in self.tools:
+                        method = getattr(obj, method_name)
+                        if callable(method):
+                            entries[method_name] = f"{module.__name__}:{obj.__qualname__}.{method_name}"
+                            self.implementations[method_name] = method
+        return entries
+    
+    def load_tool_implementations(self) -> None:
+        """
+        加载工具清单（工具名 -> 模块:属性），不导入工具模块
+        清单缓存在磁盘上，工具实现目录下的源码修改时间或工具定义变化时才重新导入全部模块生成
+        工具模块在首次获取/执行该工具时才导入
+        """
+        sources = self._source_mtimes()
+        manifest = self._read_manifest(sources)
+        if manifest is None:
+            manifest = self._discover_tools()
+            self._write_manifest(sources, manifest)
+            print(Fore.CYAN + f"已重新生成工具清单: {self.config.TOOLS_MANIFEST_PATH}")
+        self._manifest = manifest
+    
+    def _import_tool(self, tool_name: str) -> Optional[Callable]:
+        """按清单导入工具实现"""
+        target = self._manifest.get(tool_name)
+        if target is None:
+            return None
+        try:
+            obj = resolve_target(target)
         except Exception as e:
-            print(f"导入工具包失败: {e}")
-        finally:
-            # 清理 sys.path
-            if str(project_root) in sys.path:
-                sys.path.remove(str(project_root))
-
-
-
+            print(f"加载工具实现失败 {tool_name} ({target}): {e}")
+            return None
+        self.implementations[tool_name] = obj
+        return obj
+    
     def get_tool(self, tool_name: str) -> Callable:
-        """获取工具实现函数"""
-        return self.implementations.get(tool_name)
+        """获取工具实现函数（首次获取时导入所在模块）"""
+        tool_func = self.implementations.get(tool_name)
+        if tool_func is None:
+            tool_func = self._import_tool(tool_name)
+        return tool_func
+    
+    def list_tools(self) -> List[str]:
+        """有实现的工具名（按工具定义的顺序），不导入工具模块"""
+        return [tool_name for tool_name in self.tools if tool_name in self._manifest]
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """获取所有工具定义"""
         return list(self.tools.values())
     
+    def get_ollama_tools(self) -> List[Dict[str, Any]]:
+        """获取Ollama原生工具调用格式（tools字段）的工具定义，只包含已加载实现的工具"""
+        if self._ollama_tools is None:
+            self._ollama_tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool_name,
+                        "description": tool_def.get("description", ""),
+                        "parameters": tool_def.get("parameters", {"type": "object", "properties": {}})
+                    }
+                }
+                for tool_name, tool_def in self.tools.items()
+                if tool_name in self._manifest
+            ]
+        return self._ollama_tools
+    
+    def get_event_loop(self) -> asyncio.AbstractEventLoop:
+        """获取异步工具使用的常驻事件循环，不存在时创建并在后台线程中启动"""
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    started = threading.Event()
+                    
+                    def run():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(started.set)
+                        loop.run_forever()
+                    
+                    self._loop_thread = threading.Thread(target=run, name="tool-event-loop", daemon=True)
+                    self._loop_thread.start()
+                    started.wait()
+                    self._loop = loop
+        return self._loop
+    
+    def _submit_coroutine(self, coroutine) -> Future:
+        """把协程提交到常驻事件循环，返回可在其他线程等待的Future"""
+        loop = self.get_event_loop()
+        if threading.current_thread() is self._loop_thread:
+            coroutine.close()
+            raise RuntimeError("不能在工具事件循环线程中同步执行异步工具，请使用 execute_tool_async")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+    
+    def compile_validators(self) -> None:
+        """把每个工具定义的parameters预编译为参数校验器"""
+        validators = {}
+        for tool_name, tool_def in self.tools.items():
+            try:
+                validators[tool_name] = ParameterValidator(tool_def.get("parameters") or {})
+            except Exception as e:
+                print(f"编译工具参数schema失败 {tool_name}: {e}")
+        self.validators = validators
+    
+    def validate_arguments(self, tool_name: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """按预编译的校验器检查并转换参数，不合法时抛出INVALID_ARGUMENTS（工具尚未执行）"""
+        validator = self.validators.get(tool_name)
+        if validator is None:
+            return kwargs
+        arguments, errors = validator(kwargs)
+        if errors:
+            raise ToolExecutionError(
+                "INVALID_ARGUMENTS", tool_name,
+                f"工具 {tool_name} 的参数无效，请修正后重试: "
+                + "；".join(f"{name} {message}" for name, message in errors.items()),
+                invalid_arguments=errors
+            )
+        return arguments
+    
+    def _result_cache_key(self, tool_name: str, tool_func: Callable, kwargs: Dict[str, Any]) -> Optional[tuple]:
+        """
+        可缓存的调用返回缓存键，否则返回None
+        参数按函数签名补全默认值后序列化为键有序的JSON，省略参数和显式传入默认值的调用共用缓存
+        cache.files中声明的文件参数（参数名 -> 参数为空时使用的配置项）还会把文件的（路径, 大小, 修改时间）
+        加入缓存键，文件变化后不再命中旧结果
+        """
+        cache_policy = self.tools.get(tool_name, {}).get("cache")
+        if not cache_policy:
+            return None
+        # unless中列出的参数为真时不缓存（如跟踪模式每次调用都会推进读取位置）
+        if any(kwargs.get(name) for name in cache_policy.get("unless", ())):
+            return None
+        
+        if tool_name not in self._signatures:
+            try:
+                self._signatures[tool_name] = inspect.signature(tool_func)
+            except (TypeError, ValueError):
+                self._signatures[tool_name] = None
+        signature = self._signatures[tool_name]
+        params = kwargs
+        if signature is not None:
+            try:
+                bound = signature.bind(**kwargs)
+                bound.apply_defaults()
+                params = bound.arguments
+            except TypeError:
+                pass
+        try:
+            canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return None
+        return tool_name, canonical, self._file_stats(cache_policy.get("files"), params)
+    
+    def _file_stats(self, file_params: Optional[Dict[str, Optional[str]]], params: Dict[str, Any]) -> tuple:
+        """文件参数对应文件的状态（支持通配符），不存在的文件记为None"""
+        if not file_params:
+            return ()
+        stats = []
+        for name, default_setting in file_params.items():
+            path = params.get(name)
+            if path is None and default_setting:
+                path = getattr(self.config, default_setting, None)
+            if not isinstance(path, str):
+                continue
+            paths = sorted(glob.glob(path)) if any(ch in path for ch in "*?[") else [path]
+            for file_path in paths:
+                try:
+                    stat = os.stat(file_path)
+                    stats.append((os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    stats.append((os.path.abspath(file_path), None, None))
+        return tuple(stats)
+    
+    def _cache_result(self, tool_name: str, cache_key: Optional[tuple], result: Any) -> None:
+        """缓存成功的工具结果（错误结果不缓存），过期时间取工具定义中的cache.ttl"""
+        if cache_key is None:
+            return
+        if isinstance(result, dict) and (result.get("error") or result.get("success") is False):
+            return
+        self.result_cache.put(cache_key, result, ttl=self.tools[tool_name]["cache"].get("ttl"))
+    
+    async def _wait_result(self, tool_name: str, awaitable, timeout: float) -> Any:
+        """
+        等待工具结果，超过timeout秒时取消并抛出TOOL_TIMEOUT
+        只有等待本身超时才转换：工具自身抛出的超时（如网络超时）原样抛出，与ToolExecutor.result一致
+        """
+        task = asyncio.ensure_future(awaitable)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            task.cancel()
+            raise self.executor.timeout_error(tool_name)
+        return task.result()
+    
+    async def execute_tool_async(self, tool_name: str, **kwargs) -> Any:
+        """
+        执行工具（可等待版本，可在任意事件循环中调用）
+        按工具的执行策略提交，等待结果时不阻塞调用方的事件循环；参数无效、超时或并发已满时返回结构化错误
+        参数先按预编译的schema校验和转换，开启缓存的工具再查结果缓存，命中时直接返回
+        """
+        tool_func = self.get_tool(tool_name)
+        if not tool_func:
+            raise ValueError(f"工具未找到: {tool_name}")
+        
+        try:
+            kwargs = self.validate_arguments(tool_name, kwargs)
+        except ToolExecutionError as e:
+            return e.to_result()
+        
+        cache_key = self._result_cache_key(tool_name, tool_func, kwargs)
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+        
+        loop = asyncio.get_running_loop()
+        timeout = self.executor.policy(tool_name).timeout
+        try:
+            if inspect.iscoroutinefunction(tool_func) and loop is self._loop:
+                # 已在工具事件循环中：直接await，不能阻塞等待并发名额
+                release = self.executor.acquire(tool_name, wait=False)
+                try:
+                    result = await self._wait_result(tool_name, tool_func(**kwargs), timeout)
+                finally:
+                    release()
+            else:
+                # 等待并发名额可能阻塞，在默认线程池中提交
+                future = await loop.run_in_executor(None, functools.partial(
+                    self.executor.submit, tool_name, tool_func, kwargs,
+                    self._manifest.get(tool_name), self._submit_coroutine
+                ))
+                result = await self._wait_result(tool_name, asyncio.wrap_future(future), timeout)
+        except ToolExecutionError as e:
+            return e.to_result()
+        self._cache_result(tool_name, cache_key, result)
+        return result
+    
     def execute_tool(self, tool_name: str, **kwargs) -> Any:
-        """执行工具"""
+        """
+        执行工具：按工具的执行策略提交到线程池/进程池（异步工具提交到常驻事件循环），当前线程等待结果
+        参数先按预编译的schema校验和转换，开启缓存的工具再查结果缓存，命中时直接返回
+        参数无效、超时或并发已满时返回结构化错误（含error_code），工具自身的异常原样抛出
+        """
         tool_func = self.get_tool(tool_name)
         if not tool_func:
             raise ValueError(f"工具未找到: {tool_name}")
         
-        # 检查是否是异步函数
-        import inspect
-        import asyncio
+        try:
+            kwargs = self.validate_arguments(tool_name, kwargs)
+        except ToolExecutionError as e:
+            logger.warning("工具参数无效: %s", e)
+            return e.to_result()
         
-        # 打印调试信息
-        print(f"执行工具: {tool_name}")
-        print(f"工具函数: {tool_func}")
-        print(f"是否为协程函数: {inspect.iscoroutinefunction(tool_func)}")
+        cache_key = self._result_cache_key(tool_name, tool_func, kwargs)
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key, _MISSING)
+            if cached is not _MISSING:
+                logger.debug("命中工具结果缓存: %s", tool_name)
+                return cached
         
-        if inspect.iscoroutinefunction(tool_func):
-            # 异步函数需要在事件循环中执行
-            try:
-                result = asyncio.run(tool_func(**kwargs))
-                print(f"异步工具执行结果: {result}")
-                return result
-            except Exception as e:
-                print(f"执行异步工具失败: {e}")
-                raise
-        else:
-            # 同步函数直接执行
-            try:
-                result = tool_func(**kwargs)
-                print(f"同步工具执行结果: {result}")
-                return result
-            except Exception as e:
-                print(f"执行同步工具失败: {e}")
-                raise
+        # 调试信息（DEBUG级别，结果截断渲染）
+        kind = "异步" if inspect.iscoroutinefunction(tool_func) else "同步"
+        logger.debug("执行%s工具: %s (%s)", kind, tool_name, getattr(tool_func, "__qualname__", tool_func))
+        
+        try:
+            future = self.executor.submit(tool_name, tool_func, kwargs,
+                                          self._manifest.get(tool_name), self._submit_coroutine)
+            result = self.executor.result(tool_name, future)
+        except ToolExecutionError as e:
+            logger.warning("%s工具未执行完成: %s", kind, e)
+            return e.to_result()
+        except Exception as e:
+            logger.warning("执行%s工具失败: %s", kind, e)
+            raise
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s工具执行结果: %s", kind, render_value(result))
+        self._cache_result(tool_name, cache_key, result)
+        return result
+    
+    def close(self) -> None:
+        """关闭工具线程池/进程池，停止异步工具的事件循环（取消未完成的协程）"""
+        self.executor.close()
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop, self._loop_thread = None, None
+        if loop is None:
+            return
+        
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+        
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            if not thread.is_alive():
+                loop.close()
     
     def load_all(self) -> None:
         """加载所有工具"""
         self.load_tool_definitions()
         self.load_tool_implementations()
+        self.executor.configure(self.tools)
+        self.compile_validators()
+        self._ollama_tools = None
 
         print(f"共加载 {len(self.tools)} 个工具定义")
-        print(Fore.YELLOW + f"共加载 {len(self.implementations)} 个工具实现")
\ No newline at end of file
+        print(Fore.YELLOW + f"共登记 {len(self._manifest)} 个工具实现（首次调用时导入）")
\ No newline at end of file
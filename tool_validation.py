@@ -0,0 +1,209 @@
+"""
+工具参数校验 - 加载工具定义时把parameters中的JSON Schema预编译为校验/转换函数
+- 支持工具定义用到的关键字：type（string/integer/number/boolean/object/array）、properties、required、enum、items、additionalProperties
+- 能无损转换的值直接修正（如 "20" -> 20、"true" -> True、JSON字符串 -> object/array、枚举值大小写不一致）
+- 可选参数传null等同于不传；无法转换时返回每个参数的错误说明，供模型修正后重试
+每次调用只执行编译好的闭包，不再解释schema
+"""
+
+import json
+from typing import Any, Callable, Dict, Tuple
+
+
+class ParameterError(ValueError):
+    """单个参数值不合法"""
+
+
+_TRUE_TEXTS = frozenset(("true", "1", "yes", "y", "on", "是"))
+_FALSE_TEXTS = frozenset(("false", "0", "no", "n", "off", "否"))
+
+
+def _preview(value: Any) -> str:
+    text = repr(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+def _to_string(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ParameterError(f"应为string，收到 {_preview(value)}")
+
+
+def _to_integer(value: Any) -> int:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            try:
+                number = float(text)
+            except ValueError:
+                number = None
+            if number is not None and number.is_integer():
+                return int(number)
+    raise ParameterError(f"应为integer，收到 {_preview(value)}")
+
+
+def _to_number(value: Any):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return int(text)
+        except ValueError:
+            try:
+                return float(text)
+            except ValueError:
+                pass
+    raise ParameterError(f"应为number，收到 {_preview(value)}")
+
+
+def _to_boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE_TEXTS:
+            return True
+        if text in _FALSE_TEXTS:
+            return False
+    raise ParameterError(f"应为boolean，收到 {_preview(value)}")
+
+
+def _parse_json_text(value: Any, expected: type) -> Any:
+    """模型有时把object/array参数写成JSON字符串，能解析为预期类型时使用解析结果"""
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return value
+        if isinstance(parsed, expected):
+            return parsed
+    return value
+
+
+def _object_converter(schema: Dict[str, Any]) -> Callable[[Any], Dict]:
+    validator = ParameterValidator(schema)
+
+    def convert(value: Any) -> Dict:
+        value = _parse_json_text(value, dict)
+        if not isinstance(value, dict):
+            raise ParameterError(f"应为object，收到 {_preview(value)}")
+        converted, errors = validator(value)
+        if errors:
+            raise ParameterError("；".join(f"{name} {message}" for name, message in errors.items()))
+        return converted
+
+    return convert
+
+
+def _array_converter(schema: Dict[str, Any]) -> Callable[[Any], list]:
+    items = schema.get("items")
+    convert_item = compile_schema(items) if isinstance(items, dict) else None
+
+    def convert(value: Any) -> list:
+        value = _parse_json_text(value, list)
+        if isinstance(value, tuple):
+            value = list(value)
+        if not isinstance(value, list):
+            raise ParameterError(f"应为array，收到 {_preview(value)}")
+        if convert_item is None:
+            return value
+        converted = []
+        for index, item in enumerate(value):
+            try:
+                converted.append(convert_item(item))
+            except ParameterError as e:
+                raise ParameterError(f"第{index + 1}项{e}")
+        return converted
+
+    return convert
+
+
+_SCALAR_CONVERTERS = {
+    "string": _to_string,
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean
+}
+
+
+def _with_enum(convert: Callable[[Any], Any], choices: list) -> Callable[[Any], Any]:
+    """在类型转换后检查枚举值，字符串大小写不一致且只对应一个取值时自动修正"""
+    allowed = list(choices)
+    folded = {}
+    for choice in allowed:
+        if isinstance(choice, str):
+            folded.setdefault(choice.casefold(), []).append(choice)
+    hint = ", ".join(str(choice) for choice in allowed)
+
+    def convert_enum(value: Any) -> Any:
+        value = convert(value)
+        if value in allowed:
+            return value
+        if isinstance(value, str):
+            candidates = folded.get(value.strip().casefold(), [])
+            if len(candidates) == 1:
+                return candidates[0]
+        raise ParameterError(f"应为以下取值之一: {hint}，收到 {_preview(value)}")
+
+    return convert_enum
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], Any]:
+    """把一个schema节点编译为转换函数：返回（可能经过转换的）值，不合法时抛出ParameterError"""
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        convert = _object_converter(schema)
+    elif schema_type == "array":
+        convert = _array_converter(schema)
+    else:
+        # 未声明或不支持的类型不做转换
+        convert = _SCALAR_CONVERTERS.get(schema_type, lambda value: value)
+    if isinstance(schema.get("enum"), list):
+        convert = _with_enum(convert, schema["enum"])
+    return convert
+
+
+class ParameterValidator:
+    """一个object schema（工具的parameters）编译后的校验器"""
+
+    __slots__ = ("properties", "required", "closed")
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.properties: Dict[str, Callable[[Any], Any]] = {
+            name: compile_schema(property_schema)
+            for name, property_schema in (schema.get("properties") or {}).items()
+        }
+        self.required = tuple(schema.get("required") or ())
+        # additionalProperties未声明时，schema之外的参数原样传给工具
+        self.closed = schema.get("additionalProperties") is False
+
+    def __call__(self, arguments: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """校验并转换参数，返回（转换后的参数, {参数名: 错误说明}）"""
+        converted, errors = {}, {}
+        for name, value in arguments.items():
+            convert = self.properties.get(name)
+            if convert is None:
+                if self.closed:
+                    errors[name] = "不是该工具的参数"
+                else:
+                    converted[name] = value
+            elif value is not None:
+                try:
+                    converted[name] = convert(value)
+                except ParameterError as e:
+                    errors[name] = str(e)
+        for name in self.required:
+            if name not in converted and name not in errors:
+                errors[name] = "缺少必填参数"
+        return converted, errors
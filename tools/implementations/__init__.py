@@ -1,8 +1,26 @@
 # tools/implementations/__init__.py
-from .log_decorator import log_tool_call
-from .base_tools import BaseTools
-from .math_tools import MathTools
-from .log_analysis_tools import LogAnalysisTools
-from .terminal_tools import TerminalTools
+# 工具类按需导入（PEP 562）：导入本包或其中某个模块时不会连带导入全部工具模块
+import importlib
 
-__all__ = ['log_tool_call', 'BaseTools', 'MathTools', 'LogAnalysisTools', 'TerminalTools']
\ No newline at end of file
+_LAZY_ATTRIBUTES = {
+    'log_tool_call': '.log_decorator',
+    'BaseTools': '.base_tools',
+    'MathTools': '.math_tools',
+    'LogAnalysisTools': '.log_analysis_tools',
+    'TerminalTools': '.terminal_tools',
+}
+
+__all__ = ['log_tool_call', 'BaseTools', 'MathTools', 'LogAnalysisTools', 'TerminalTools']
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -2,6 +2,7 @@ import requests
 import json
 from config import config
 from .log_decorator import log_tool_call
+from .threat_matcher import get_threat_matcher
 
 class HttpTools:
     """HTTP请求工具类"""
@@ -128,80 +129,20 @@ class HttpTools:
         else:
             log_text = str(log_data)
         
-        # 定义常见的渗透攻击模式
-        intrusion_patterns = {
-            "sql_injection": [
-                "' OR '1'='1'",
-                "UNION SELECT",
-                "DROP TABLE",
-                "INSERT INTO",
-                "UPDATE.*SET",
-                "DELETE FROM",
-                "EXEC xp_",
-                "1=1",
-                "OR 1=1",
-                "AND 1=0"
-            ],
-            "xss": [
-                "<script>",
-                "javascript:",
-                "onerror=",
-                "onload=",
-                "onclick=",
-                "<iframe>",
-                "<img src=x onerror=",
-                "alert("
-            ],
-            "sensitive_files": [
-                "/etc/passwd",
-                "/etc/shadow",
-                ".env",
-                "config.php",
-                "web.config",
-                "appsettings.json",
-                "database.yml"
-            ],
-            "command_injection": [
-                "; ls",
-                "| cat",
-                "&& echo",
-                "; ping",
-                "| ping",
-                "&& ping",
-                "`id`",
-                "$(id)"
-            ],
-            "path_traversal": [
-                "../",
-                "..\\",
-                "%2e%2e%2f",
-                "%2e%2e%5c"
-            ],
-            "unusual_requests": [
-                "404 Not Found",
-                "500 Internal Server Error",
-                "403 Forbidden",
-                "401 Unauthorized"
-            ]
-        }
-        
-        # 检测渗透痕迹
-        detected_intrusions = []
-        
-        for pattern_type, patterns in intrusion_patterns.items():
-            for pattern in patterns:
-                if pattern.lower() in log_text.lower():
-                    detected_intrusions.append({
-                        "type": pattern_type,
-                        "pattern": pattern
-                    })
+        # 检测渗透痕迹：特征库见规则文件（intrusion分析器），单次扫描报告全部命中的特征
+        matcher = get_threat_matcher("intrusion")
+        detected_intrusions = [
+            {"type": rule.category, "pattern": rule.pattern}
+            for rule in matcher.scan(log_text)
+        ]
         
         # 分析结果
         result = {
             "has_intrusion": len(detected_intrusions) > 0,
             "intrusions": detected_intrusions,
             "total_intrusions": len(detected_intrusions),
-            "log_sample": log_text[:1000]  # 提供日志样本，最多1000字符
+            "log_sample": log_text[:1000],  # 提供日志样本，最多1000字符
+            "rules_version": matcher.version
         }
         
         return result
\ No newline at end of file
@@ -1,8 +1,22 @@
+import os
 import re
+import glob
+import json
+import hashlib
+import heapq
+import threading
+import multiprocessing
+import time
+import uuid
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from .log_decorator import log_tool_call
-from config import config
+from .threat_matcher import get_threat_matcher
+from config import config, get_log_queue, init_worker_logging
+from result_cache import ResultCache, estimate_size
 
 # 全局正则表达式：适配GeoServer日志格式（syslog封装+中文月份）
 PATTERN_GEOSERVER_CORE = re.compile(
@@ -14,20 +28,12 @@ PATTERN_GEOSERVER_CORE = re.compile(
     \[(?P<module>[^\]]+)\]\s+-\s+
     (?P<client_ip>\d+\.\d+\.\d+\.\d+)\s+
     "?(?P<http_method>\w+)\s+(?P<request_uri>[^"\s]+)"?\s+
-    (?:"(?P<user_agent>[^"]*)")?\s+
+    (?:"(?P<user_agent>[^"]*)")?\s*
     (?:"(?P<referer>[^"]*)")?
     """,
     re.VERBOSE | re.IGNORECASE
 )
 
-# 安全特征库
-THREAT_SIGNATURES = {
-    "RCE_KEYWORDS": re.compile(r"(java\.lang\.Runtime|ProcessBuilder|getRuntime|exec|eval)", re.I),
-    "SHELL_COMMANDS": re.compile(r"(wget|curl|chmod|chown|bash|sh\s+-c|python|perl|nc\s+|netcat)", re.I),
-    "ENCODING_PATTERNS": re.compile(r"(base64|%[0-9a-f]{2})", re.I),
-    "TRAVERSAL_PATTERNS": re.compile(r"(\.\./|\.\.\\)", re.I),
-}
-
 # 匹配耗时日志行：took Xms
 PATTERN_RESPONSE_TIME = re.compile(r"took\s+(?P<response_time>\d+)ms")
 
@@ -44,29 +50,40 @@ FILTER_KEYWORDS = [
     "Cookie: ", "about to encode JSON", "Request: getServiceInfo"
 ]
 
+# 冗余日志前缀（str.startswith一次比较全部关键词）
+FILTER_KEYWORD_PREFIXES = tuple(FILTER_KEYWORDS)
+
+# 请求日志预筛选：模块标记"] - "后紧跟IP。是PATTERN_GEOSERVER_CORE匹配的必要条件，
+# 不满足的行（启动配置、告警、请求头等）无需再跑完整正则
+PATTERN_REQUEST_CANDIDATE = re.compile(r"\]\s+-\s+\d+\.\d+\.\d+\.\d+\s")
+
 # IP过滤列表
 FILTER_IP = ["127.0.0.1", "172.16.37.0"]
 
+# 中文月份（GeoServer日志正文）与英文月份缩写（syslog头部）
+MONTH_MAP_CN = {f"{month}月": month for month in range(1, 13)}
+MONTH_MAP_SYSLOG = {
+    name: index for index, name in enumerate(
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)
+}
+
+# 流式读取日志文件的块大小（字节）
+READ_CHUNK_SIZE = 1024 * 1024
+
+# 解析逻辑版本：解析、配对或报告结构变化时递增，使已缓存的分析结果失效
+PARSER_VERSION = 1
+
 class SecurityEngine:
     @staticmethod
     def analyze(log_entry: dict) -> dict:
         """
         分析结构化日志，识别潜在威胁
         """
-        threats = []
-        payload = (log_entry.get("query_string") or "") + (log_entry.get("raw_log") or "")
-        
-        # 1. 检测 Java 注入特征
-        if THREAT_SIGNATURES["RCE_KEYWORDS"].search(payload):
-            threats.append("Critical: Java RCE Keyword Detected")
-            
-        # 2. 检测 危险系统命令
-        if THREAT_SIGNATURES["SHELL_COMMANDS"].search(payload):
-            threats.append("High: Shell Command Injection Attempt")
-            
-        # 3. 检测 目录穿越
-        if THREAT_SIGNATURES["TRAVERSAL_PATTERNS"].search(payload):
-            threats.append("Medium: Path Traversal Attempt")
+        # 特征库见规则文件（geoserver分析器）：Java注入、危险系统命令、目录穿越
+        matched = get_threat_matcher("geoserver").scan(
+            log_entry.get("query_string") or "", log_entry.get("raw_log") or ""
+        )
+        threats = [rule.message for rule in matched]
 
         return {
             "is_threat": len(threats) > 0,
@@ -74,20 +91,210 @@ class SecurityEngine:
             "threat_details": threats
         }
 
+class TimestampDecoder:
+    """
+    日志时间戳解码器：日志正文只有“日 月 时:分:秒”，年份需要推断
+    - 参考时间取文件修改时间（日志中的记录不会晚于它），没有文件时取当前时间
+    - 行首有syslog头部时，以头部时间为准：RFC5424头部自带年份；RFC3164头部只有月份，
+      年份按参考时间推断。记录时间不晚于头部时间，跨年（12月的记录、1月的头部）自动回退一年
+    - 日期部分按（头部、日、月）缓存，每条记录只需拼接时分秒
+    """
+
+    def __init__(self, reference: Optional[datetime] = None):
+        reference = reference or datetime.now()
+        self.reference_year = reference.year
+        self.reference_month = reference.month
+        self._dates: Dict[tuple, Tuple] = {}
+
+    @classmethod
+    def for_file(cls, log_file_path: str) -> "TimestampDecoder":
+        """以文件修改时间为参考创建解码器"""
+        try:
+            return cls(datetime.fromtimestamp(os.path.getmtime(log_file_path)))
+        except OSError:
+            return cls()
+
+    @staticmethod
+    def _year_not_after(month: int, ref_year: int, ref_month: int) -> int:
+        """返回使（年, month）不晚于参考年月的最近年份"""
+        return ref_year if month <= ref_month else ref_year - 1
+
+    @staticmethod
+    def _header_token(log_line: str) -> str:
+        """截取syslog头部中与年月相关的片段（"<133>Feb  5 ..." 或 "<133>1 2026-02-05T..."）"""
+        if not log_line.startswith("<"):
+            return ""
+        end = log_line.find(">", 1, 6)
+        return log_line[end + 1:end + 10] if end > 0 else ""
+
+    def _reference_for(self, token: str) -> Tuple[int, int]:
+        """由syslog头部得到（年, 月）上界，没有可用头部时使用参考时间"""
+        if token[:2] == "1 " and token[2:6].isdigit() and token[7:9].isdigit():
+            return int(token[2:6]), int(token[7:9])  # RFC5424：头部自带年份
+        month = MONTH_MAP_SYSLOG.get(token[:3])
+        if month:
+            return self._year_not_after(month, self.reference_year, self.reference_month), month
+        return self.reference_year, self.reference_month
+
+    def _decode_date(self, token: str, day_str: str, mon_cn: str) -> Tuple:
+        """解码日期部分：返回（日期字符串, 当天零点的epoch, 解析失败时使用的前缀）"""
+        ref_year, ref_month = self._reference_for(token)
+        month = MONTH_MAP_CN.get(mon_cn, 1)  # 默认1月防止报错
+        year = self._year_not_after(month, ref_year, ref_month)
+        fallback = f"{year}-{mon_cn}-{day_str}"
+        try:
+            midnight = datetime(year, month, int(day_str))
+        except ValueError:
+            return None, None, fallback
+        # 按本机时区换算epoch
+        return midnight.strftime("%Y-%m-%d"), int(time.mktime(midnight.timetuple())), fallback
+
+    def decode(self, day_str: str, mon_cn: str, time_str: str, log_line: str = "") -> Tuple[str, Optional[int]]:
+        """
+        解码时间戳
+        :param log_line: 原始日志行（用于读取syslog头部）
+        :return: （"YYYY-MM-DD HH:MM:SS"格式的时间字符串, epoch秒数）；日期或时间非法时返回原样拼接的字符串和None
+        """
+        key = (self._header_token(log_line), day_str, mon_cn)
+        date = self._dates.get(key)
+        if date is None:
+            date = self._dates[key] = self._decode_date(*key)
+        date_str, midnight, fallback = date
+
+        if midnight is not None:
+            hour, minute, second = int(time_str[0:2]), int(time_str[3:5]), int(time_str[6:8])
+            if hour < 24 and minute < 60 and second < 60:
+                return f"{date_str} {time_str}", midnight + hour * 3600 + minute * 60 + second
+        # 解析失败，回退到原始字符串
+        return f"{fallback} {time_str}", None
+
+
+class RequestCorrelationCache:
+    """
+    请求关联缓存：暂存发起日志，等待同一请求的耗时日志（took Xms）来配对
+    - 同一请求标识可能同时有多个未完成的请求，按先进先出配对
+    - 按日志时间淘汰：超过ttl_seconds仍未等到耗时日志的请求视为已完成（无响应时间）
+    - 按数量淘汰：超过max_entries时最早的请求视为已完成
+    淘汰的记录由add/expire返回，调用方照常输出，内存占用有上限
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = config.LOG_CORRELATION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = config.LOG_CORRELATION_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries: "OrderedDict[int, Tuple[str, Dict]]" = OrderedDict()  # 按加入顺序（即日志时间）排列
+        self._by_key: Dict[str, deque] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, request_key: str, record: Dict) -> List[Dict]:
+        """加入一条发起日志，返回因超时或超量被淘汰的记录"""
+        self._seq += 1
+        self._entries[self._seq] = (request_key, record)
+        self._by_key.setdefault(request_key, deque()).append(self._seq)
+        evicted = self.expire(record.get("epoch"))
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._pop_oldest())
+        return evicted
+
+    def pop(self, request_key: str) -> Optional[Dict]:
+        """取出该请求标识最早的一条发起日志，没有则返回None"""
+        seqs = self._by_key.get(request_key)
+        if not seqs:
+            return None
+        seq = seqs.popleft()
+        if not seqs:
+            del self._by_key[request_key]
+        return self._entries.pop(seq)[1]
+
+    def expire(self, now: Optional[int]) -> List[Dict]:
+        """淘汰日志时间早于 now - ttl_seconds 的请求（now为epoch秒数，None表示不按时间淘汰）"""
+        evicted = []
+        if now is None or not self.ttl_seconds:
+            return evicted
+        deadline = now - self.ttl_seconds
+        while self._entries:
+            epoch = next(iter(self._entries.values()))[1].get("epoch")
+            if epoch is None or epoch >= deadline:
+                break
+            evicted.append(self._pop_oldest())
+        return evicted
+
+    def _pop_oldest(self) -> Dict:
+        seq, (request_key, record) = self._entries.popitem(last=False)
+        seqs = self._by_key[request_key]
+        seqs.popleft()
+        if not seqs:
+            del self._by_key[request_key]
+        return record
+
+    def load(self, items: Iterable[Tuple[str, Dict]]) -> None:
+        """
+        按顺序恢复detached_items()导出的内容（不触发淘汰）
+        恢复的记录只使用内联的原始日志：保存时的来源位置在日志轮转或截断后可能指向别的行
+        """
+        for request_key, record in items:
+            record["source_file"], record["source_offset"] = None, None
+            self._seq += 1
+            self._entries[self._seq] = (request_key, record)
+            self._by_key.setdefault(request_key, deque()).append(self._seq)
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        """按加入顺序返回全部（请求标识, 记录）"""
+        return list(self._entries.values())
+
+    def detached_items(self) -> List[Tuple[str, Dict]]:
+        """按加入顺序返回全部（请求标识, 记录），记录去掉来源位置、只保留内联的原始日志，用于持久化"""
+        return [(request_key, {**record, "source_file": None, "source_offset": None})
+                for request_key, record in self._entries.values()]
+
+    def values(self) -> List[Dict]:
+        return [record for _, record in self._entries.values()]
+
+    def drain(self) -> List[Dict]:
+        """按加入顺序取出全部记录并清空"""
+        records = self.values()
+        self.clear()
+        return records
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_key.clear()
+
+
 class GeoServerLogParser:
-    def __init__(self):
-        self.request_cache: Dict[str, Dict] = {}  # 请求缓存：聚合同一请求的发起/耗时日志
-        self.parsed_results: List[Dict] = []      # 最终结构化结果
+    def __init__(self, track_boundary: bool = False, prefilter: bool = True):
+        """
+        :param track_boundary: 是否记录分块边界信息（并行解析时使用）。
+            开启后，在本块内找不到发起日志的耗时日志不直接产出，
+            而是记录下来交给合并阶段与前面块遗留的请求配对
+        :param prefilter: 是否在完整正则之前做分级预筛选（关闭仅用于基准对比）
+        """
+        self.request_cache = RequestCorrelationCache()  # 请求缓存：聚合同一请求的发起/耗时日志
+        self.parsed_results: List[Dict] = []      # 最终结构化结果（parse_logs使用）
+        self._completed = deque()                 # 已完成聚合、等待产出的记录
+        self.lines_processed = 0                  # 已读取的日志行数
+        self.track_boundary = track_boundary
+        self.boundary_completions: List[Tuple[str, Dict]] = []  # 本块内找不到发起日志的耗时日志
+        self.last_epoch: Optional[int] = None     # 最近一条解析记录的时间
+        self.prefilter = prefilter
+        self.timestamps = TimestampDecoder()      # 时间戳解码器，解析文件时按文件修改时间重建
+        self.source_file: Optional[str] = None    # 正在解析的文件
 
     def _filter_redundant(self, log_line: str) -> bool:
         """过滤冗余日志行，返回True=保留，False=丢弃"""
         log_line_strip = log_line.strip()
-        if not log_line_strip:
-            return False
-        for keyword in FILTER_KEYWORDS:
-            if log_line_strip.startswith(keyword):
-                return False
-        return True
+        return bool(log_line_strip) and not log_line_strip.startswith(FILTER_KEYWORD_PREFIXES)
+
+    @staticmethod
+    def _is_request_candidate(log_line: str) -> bool:
+        """
+        分级预筛选，返回True=可能是请求日志，需要完整解析
+        1. 字符串查找模块标记"]"（没有模块标记的续行、请求头直接排除）
+        2. 以"]"开头的小正则确认"] - IP"结构（排除CONFIG/WARN等无IP的日志）
+        """
+        return "]" in log_line and PATTERN_REQUEST_CANDIDATE.search(log_line) is not None
 
     def _filter_ip(self, client_ip: str) -> bool:
         """
@@ -100,9 +307,9 @@ class GeoServerLogParser:
                 return False
         return True
 
-    def _get_request_key(self, client_ip: str, request_uri: str) -> str:
-        """生成请求唯一标识：用于聚合同一请求的发起/耗时日志"""
-        return f"{client_ip}_{request_uri.split('?')[0]}_{request_uri[-20:]}"
+    def _get_request_key(self, client_ip: str, http_method: str, request_uri: str) -> str:
+        """生成请求唯一标识：用于聚合同一请求的发起/耗时日志（URI完整参与，避免同后缀的请求冲突）"""
+        return f"{client_ip} {http_method} {request_uri}"
 
     def _parse_wfs_biz(self, log_lines: List[str]) -> Dict:
         """从日志行中提取WFS业务核心字段"""
@@ -129,11 +336,13 @@ class GeoServerLogParser:
         else:
             return "OTHER"
 
-    def parse_single_line(self, log_line: str, raw_log: Optional[str] = None) -> Optional[Dict]:
+    def parse_single_line(self, log_line: str, raw_log: Optional[str] = None,
+                          raw_offset: Optional[int] = None) -> Optional[Dict]:
         """
         解析单条GeoServer日志行
         :param log_line: 清洗后的日志行
         :param raw_log: 原始日志行（可选，用于留存）
+        :param raw_offset: 原始日志行在source_file中的字节偏移（从文件解析时传入）
         :return: 结构化字典/None（未匹配）
         """
         match = PATTERN_GEOSERVER_CORE.search(log_line)
@@ -146,28 +355,10 @@ class GeoServerLogParser:
             # 命中过滤IP → 直接返回None，不解析后续内容
             return None
 
-        # 基础字段提取
-        month_map = {
-            "1月": "01", "2月": "02", "3月": "03", "4月": "04",
-            "5月": "05", "6月": "06", "7月": "07", "8月": "08",
-            "9月": "09", "10月": "10", "11月": "11", "12月": "12"
-        }
-
-        day_str = match.group('day')
-        mon_cn = match.group('mon_cn')
-        time_str = match.group('time')
-
-        # 组合正确的日期字符串
-        current_year = "2026"
-        month_str = month_map.get(mon_cn, "01") # 默认1月防止报错
-
-        try:
-            # 构造格式：2026-02-03 10:44:25
-            formatted_date = f"{current_year}-{month_str}-{day_str} {time_str}"
-            log_time = datetime.strptime(formatted_date, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            # 如果解析失败，回退到原始字符串
-            log_time = f"{current_year}-{mon_cn}-{day_str} {time_str}"
+        # 基础字段提取：时间戳格式 2026-02-03 10:44:25（年份由解码器推断）
+        log_time, log_epoch = self.timestamps.decode(
+            match.group('day'), match.group('mon_cn'), match.group('time'), log_line
+        )
 
         http_method = match.group("http_method").strip()
         request_uri = match.group("request_uri").strip()
@@ -181,11 +372,12 @@ class GeoServerLogParser:
             response_time_ms = int(rt_match.group("response_time"))
 
         # 生成请求唯一标识
-        request_key = self._get_request_key(client_ip, request_uri)
+        request_key = self._get_request_key(client_ip, http_method, request_uri)
 
         # 基础结构化字典（轻量化安全审计字段）
         structured = {
             "timestamp": log_time,          # 标准化时间戳
+            "epoch": log_epoch,             # 时间戳对应的epoch秒数（解析失败为None）
             "client_ip": client_ip,         # 客户端IP
             "http_method": http_method,     # 请求方法
             "request_path": request_path,   # 请求路径
@@ -200,7 +392,9 @@ class GeoServerLogParser:
             "geo_action": "",               # GIS操作
             "geo_layer": "",                # GIS图层名
             "geo_version": "",              # GIS版本
-            "raw_log": raw_log or log_line  # 原始日志
+            "raw_log": raw_log or log_line,  # 原始日志
+            "source_file": self.source_file if raw_offset is not None else None,  # 原始日志所在文件
+            "source_offset": raw_offset     # 原始日志在文件中的字节偏移
         }
 
         # --- 集成安全分析引擎 ---
@@ -216,158 +410,946 @@ class GeoServerLogParser:
             structured["geo_service"] = "STATIC"
             structured["geo_action"] = "STATIC_RESOURCE"
 
+        # 超时仍未等到耗时日志的请求按已完成输出
+        if log_epoch is not None:
+            self.last_epoch = log_epoch
+            self._completed.extend(self.request_cache.expire(log_epoch))
+
         # 聚合请求：缓存无响应时间的请求，补全后加入最终结果
         if response_time_ms == 0:
-            self.request_cache[request_key] = structured
+            self._completed.extend(self.request_cache.add(request_key, structured))
         else:
-            if request_key in self.request_cache:
+            cached = self.request_cache.pop(request_key)
+            if cached is not None:
                 # 补全缓存请求的响应时间，加入最终结果
-                cached = self.request_cache.pop(request_key)
                 cached["response_time_ms"] = response_time_ms
-                self.parsed_results.append(cached)
+                self._completed.append(cached)
+            elif self.track_boundary:
+                # 发起日志可能在前面的块中，交给合并阶段配对
+                self.boundary_completions.append((request_key, structured))
             else:
-                self.parsed_results.append(structured)
+                self._completed.append(structured)
 
         return structured
 
+    def reset(self) -> None:
+        """清空解析状态"""
+        self.request_cache.clear()
+        self.parsed_results.clear()
+        self._completed.clear()
+        self.lines_processed = 0
+        self.boundary_completions.clear()
+        self.last_epoch = None
+
+    def _feed(self, line: str, offset: Optional[int] = None) -> None:
+        """解析一行原始日志，完成聚合的记录进入_completed"""
+        self.lines_processed += 1
+        line_strip = line.strip()
+        # 第一步：过滤空行和冗余日志
+        if not line_strip or line_strip.startswith(FILTER_KEYWORD_PREFIXES):
+            return
+        # 第二步：预筛选，只有可能是请求日志的行才跑完整正则
+        if self.prefilter and not self._is_request_candidate(line_strip):
+            return
+        # 第三步：解析核心日志行（IP过滤在parse_single_line内完成）
+        self.parse_single_line(line_strip, raw_log=line, raw_offset=offset)
+
+    def iter_lines(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """
+        逐行解析，边解析边产出已完成聚合的记录（不包含缓存中尚未等到耗时日志的请求）
+        :param lines: 原始日志行（不含换行符）
+        """
+        for line in lines:
+            self._feed(line)
+            while self._completed:
+                yield self._completed.popleft()
+
+    def iter_ranges(self, ranges: Iterable[Tuple[str, int, Optional[int]]],
+                    chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+        """
+        按顺序解析若干文件区间（视为连续的日志流），用法同iter_lines
+        记录带上来源文件和字节偏移，原始日志可以按需从文件读回
+        """
+        for path, start, end in ranges:
+            self.timestamps = TimestampDecoder.for_file(path)
+            self.source_file = path
+            for offset, line in self.read_lines(path, chunk_size, start, end, with_offsets=True):
+                self._feed(line, offset)
+                while self._completed:
+                    yield self._completed.popleft()
+
+    def flush(self) -> Iterator[Dict]:
+        """产出缓存中剩余的无耗时日志（兜底），并清空缓存"""
+        yield from self.request_cache.drain()
+
+    def iter_records(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """从头解析一组日志行，逐条产出最终结构化记录"""
+        self.reset()
+        yield from self.iter_lines(lines)
+        yield from self.flush()
+
+    @staticmethod
+    def read_lines(log_file_path: str, chunk_size: int = READ_CHUNK_SIZE,
+                   start: int = 0, end: Optional[int] = None, with_offsets: bool = False) -> Iterator:
+        """
+        按块读取日志文件并逐行产出，内存占用与文件大小无关
+        :param start: 起始字节偏移（应位于行首）
+        :param end: 结束字节偏移（不含，应位于行首），默认读到文件末尾
+        :param with_offsets: 为True时产出（行首字节偏移, 行）
+        """
+        with open(log_file_path, "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            position = start
+            pending = b""
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                lines = (pending + chunk).split(b"\n")
+                # 最后一段可能是不完整的行，留到下一块拼接
+                pending = lines.pop()
+                if with_offsets:
+                    for line in lines:
+                        yield position, line.rstrip(b"\r").decode("utf-8", errors="replace")
+                        position += len(line) + 1
+                else:
+                    for line in lines:
+                        yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+            if pending:
+                line = pending.rstrip(b"\r").decode("utf-8", errors="replace")
+                yield (position, line) if with_offsets else line
+
+    @staticmethod
+    def read_line_at(handle, offset: int) -> str:
+        """从已打开的文件（二进制模式）中读回指定偏移处的一行，解码方式与read_lines一致"""
+        handle.seek(offset)
+        return handle.readline().rstrip(b"\n").rstrip(b"\r").decode("utf-8", errors="replace")
+
+    def iter_file(self, log_file_path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+        """流式解析日志文件，逐条产出最终结构化记录"""
+        self.reset()
+        yield from self.iter_ranges([(log_file_path, 0, None)], chunk_size)
+        yield from self.flush()
+
     def parse_logs(self, log_content: str) -> List[Dict]:
         """
         解析批量日志内容（文件/流读取的字符串）
         :param log_content: 原始日志内容（按行分隔）
         :return: 最终结构化日志列表
         """
-        self.request_cache.clear()
-        self.parsed_results.clear()
+        results = list(self.iter_records(log_content.splitlines()))
+        self.parsed_results.extend(results)
+        return self.parsed_results
 
-        # 按行解析
-        for line in log_content.splitlines():
-            line_strip = line.strip()
-            # 第一步：过滤冗余日志
-            if not self._filter_redundant(line_strip):
-                continue
-            # 第二步：解析核心日志行（IP过滤在parse_single_line内完成）
-            self.parse_single_line(line_strip, raw_log=line)
-
-        # 缓存中剩余的无耗时日志，加入最终结果（兜底）
-        self.parsed_results.extend(self.request_cache.values())
-        self.request_cache.clear()
 
-        return self.parsed_results
+class LogRecordStore:
+    """
+    列式日志记录存储：解析记录按列保存，需要时再还原为字典
+    - 分类字段（IP、模块、UA等取值重复度高）保存为整数编码，取值表去重
+    - 响应时间、epoch、时分秒保存在array数值列中
+    - 原始日志只保存（文件, 字节偏移），读回时再从文件取；没有来源文件的记录保存原文
+    - query_string可由原始日志重新解析得到，不单独保存
+    """
+
+    # 分类字段（按取值去重编码）
+    CATEGORICAL_FIELDS = (
+        "client_ip", "http_method", "request_path", "request_type", "user_agent", "referer",
+        "log_level", "log_module", "geo_service", "geo_action", "geo_layer", "geo_version",
+        "threat_level", "threat_details", "source_file", "date"
+    )
+    NO_VALUE = -1  # 数值列中表示None
+
+    def __init__(self):
+        self._values: Dict[str, List] = {field: [] for field in self.CATEGORICAL_FIELDS}  # 编码 -> 取值
+        self._codes_of: Dict[str, Dict] = {field: {} for field in self.CATEGORICAL_FIELDS}  # 取值 -> 编码
+        self._columns: Dict[str, array] = {field: array("I") for field in self.CATEGORICAL_FIELDS}
+        self.seconds = array("l")           # 时间戳的时分秒部分（当天秒数）
+        self.epoch = array("q")
+        self.response_time_ms = array("q")
+        self.source_offset = array("q")
+        self._inline_raw: Dict[int, str] = {}     # 行号 -> 原始日志（没有来源文件的记录）
+        self._inline_time: Dict[int, str] = {}    # 行号 -> 时间戳（时分秒不是HH:MM:SS时原样保存）
+
+    def __len__(self) -> int:
+        return len(self.epoch)
+
+    def _intern(self, field: str, value) -> int:
+        codes = self._codes_of[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[field])
+            self._values[field].append(value)
+        return code
+
+    def value(self, row: int, field: str):
+        """读取单个分类字段的值"""
+        return self._values[field][self._columns[field][row]]
+
+    def append(self, record: Dict) -> int:
+        """追加一条解析记录，返回行号"""
+        row = len(self)
+        for field in self.CATEGORICAL_FIELDS[:-3]:
+            self._columns[field].append(self._intern(field, record.get(field, "")))
+        self._columns["threat_details"].append(self._intern("threat_details", tuple(record.get("threat_details") or ())))
+
+        date, _, clock = record["timestamp"].rpartition(" ")
+        if len(clock) == 8 and clock[2] == clock[5] == ":" and (clock[:2] + clock[3:5] + clock[6:]).isdigit():
+            self.seconds.append(int(clock[:2]) * 3600 + int(clock[3:5]) * 60 + int(clock[6:]))
+        else:
+            self.seconds.append(self.NO_VALUE)
+            self._inline_time[row] = record["timestamp"]
+        self._columns["date"].append(self._intern("date", date))
+
+        epoch = record.get("epoch")
+        self.epoch.append(self.NO_VALUE if epoch is None else epoch)
+        self.response_time_ms.append(record.get("response_time_ms") or 0)
+
+        if record.get("source_offset") is None:
+            self._columns["source_file"].append(self._intern("source_file", None))
+            self.source_offset.append(self.NO_VALUE)
+            self._inline_raw[row] = record["raw_log"]
+        else:
+            self._columns["source_file"].append(self._intern("source_file", record["source_file"]))
+            self.source_offset.append(record["source_offset"])
+        return row
+
+    def extend(self, other: "LogRecordStore") -> None:
+        """追加另一个存储的全部记录（重新编码分类字段）"""
+        base = len(self)
+        for field in self.CATEGORICAL_FIELDS:
+            mapping = [self._intern(field, value) for value in other._values[field]]
+            self._columns[field].extend(array("I", (mapping[code] for code in other._columns[field])))
+        self.seconds.extend(other.seconds)
+        self.epoch.extend(other.epoch)
+        self.response_time_ms.extend(other.response_time_ms)
+        self.source_offset.extend(other.source_offset)
+        self._inline_raw.update((base + row, raw) for row, raw in other._inline_raw.items())
+        self._inline_time.update((base + row, ts) for row, ts in other._inline_time.items())
+
+    def timestamp(self, row: int) -> str:
+        if row in self._inline_time:
+            return self._inline_time[row]
+        seconds = self.seconds[row]
+        return f"{self.value(row, 'date')} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+    def records(self, rows: Optional[Iterable[int]] = None) -> Iterator[Dict]:
+        """按行号还原记录字典（默认全部），同一文件只打开一次"""
+        handles = {}
+        try:
+            for row in (range(len(self)) if rows is None else rows):
+                yield self._build_record(row, handles)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    def record(self, row: int) -> Dict:
+        """还原单条记录字典"""
+        return next(self.records([row]))
+
+    def raw_log(self, row: int, handles: Optional[Dict] = None) -> str:
+        """读取原始日志（从来源文件按偏移读回）"""
+        if row in self._inline_raw:
+            return self._inline_raw[row]
+        path = self.value(row, "source_file")
+        if handles is None:
+            with open(path, "rb") as handle:
+                return GeoServerLogParser.read_line_at(handle, self.source_offset[row])
+        handle = handles.get(path)
+        if handle is None:
+            handle = handles[path] = open(path, "rb")
+        return GeoServerLogParser.read_line_at(handle, self.source_offset[row])
+
+    def _build_record(self, row: int, handles: Dict) -> Dict:
+        raw_log = self.raw_log(row, handles)
+        match = PATTERN_GEOSERVER_CORE.search(raw_log.strip())
+        request_uri = match.group("request_uri").strip() if match else ""
+        threat_details = list(self.value(row, "threat_details"))
+        epoch = self.epoch[row]
+        offset = self.source_offset[row]
+        record = {
+            "timestamp": self.timestamp(row),
+            "epoch": None if epoch == self.NO_VALUE else epoch,
+            "client_ip": self.value(row, "client_ip"),
+            "http_method": self.value(row, "http_method"),
+            "request_path": self.value(row, "request_path"),
+            "query_string": request_uri.split('?')[1] if '?' in request_uri else "",
+            "request_type": self.value(row, "request_type"),
+            "user_agent": self.value(row, "user_agent"),
+            "referer": self.value(row, "referer"),
+            "log_level": self.value(row, "log_level"),
+            "log_module": self.value(row, "log_module"),
+            "response_time_ms": self.response_time_ms[row],
+            "geo_service": self.value(row, "geo_service"),
+            "geo_action": self.value(row, "geo_action"),
+            "geo_layer": self.value(row, "geo_layer"),
+            "geo_version": self.value(row, "geo_version"),
+            "raw_log": raw_log,
+            "source_file": self.value(row, "source_file"),
+            "source_offset": None if offset == self.NO_VALUE else offset,
+            "is_threat": bool(threat_details),
+            "threat_level": self.value(row, "threat_level"),
+            "threat_details": threat_details
+        }
+        return record
+
+    def memory_bytes(self) -> int:
+        """估算占用的内存（字节）：数值列、编码列和去重后的取值表"""
+        columns = [*self._columns.values(), self.seconds, self.epoch, self.response_time_ms, self.source_offset]
+        size = sum(column.itemsize * len(column) for column in columns)
+        size += sum(estimate_size(values) for values in self._values.values())
+        size += estimate_size(self._inline_raw) + estimate_size(self._inline_time)
+        return size
+
+    def detached_records(self) -> Iterator[Dict]:
+        """还原全部记录并内联原始日志、去掉来源位置（来源文件之后可能被轮转），用于持久化"""
+        for record in self.records():
+            record["source_file"], record["source_offset"] = None, None
+            yield record
+
+
+class ChainedRecordStore:
+    """
+    多个LogRecordStore首尾相接的只读视图：行号连续编号，不复制记录
+    提供ThreatReportBuilder读取威胁时用到的接口（len、value、timestamp、records、memory_bytes）
+    """
+
+    def __init__(self, *stores: LogRecordStore):
+        self.stores = stores
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self.stores)
+
+    def _locate(self, row: int) -> Tuple[LogRecordStore, int]:
+        for store in self.stores:
+            if row < len(store):
+                return store, row
+            row -= len(store)
+        raise IndexError(row)
+
+    def value(self, row: int, field: str):
+        store, row = self._locate(row)
+        return store.value(row, field)
+
+    def timestamp(self, row: int) -> str:
+        store, row = self._locate(row)
+        return store.timestamp(row)
+
+    def records(self, rows: Optional[Iterable[int]] = None) -> Iterator[Dict]:
+        """按行号还原记录字典（默认全部），同一文件只打开一次"""
+        handles = {}
+        try:
+            for row in (range(len(self)) if rows is None else rows):
+                store, local_row = self._locate(row)
+                yield store._build_record(local_row, handles)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    def memory_bytes(self) -> int:
+        return sum(store.memory_bytes() for store in self.stores)
+
+
+class ThreatReportBuilder:
+    """威胁报告构建器：逐条接收解析记录，只保留统计数据和威胁记录（列式存储），不保留全部记录"""
+
+    SEVERITY_RANK = {"High": 2, "Medium": 1, "Low": 0}
+    # 分页报告可选的字段（occurrences/first_seen/last_seen只在去重时提供）
+    PAGE_FIELDS = ("threat_level", "timestamp", "client_ip", "threat_details", "raw_payload", "full_raw_log",
+                   "http_method", "request_path", "query_string", "occurrences", "first_seen", "last_seen")
+    DEFAULT_FIELDS = tuple(field for field in PAGE_FIELDS if field != "full_raw_log")
+
+    def __init__(self):
+        self.total_processed_lines = 0
+        self.total_valid_requests = 0
+        self.threats = LogRecordStore()
+
+    def add(self, entry: Dict) -> None:
+        """累加一条解析记录"""
+        self.total_valid_requests += 1
+        if entry.get("is_threat"):
+            self.threats.append(entry)
+
+    def merge(self, other: "ThreatReportBuilder") -> None:
+        """合并另一个构建器的统计数据和威胁记录"""
+        self.total_processed_lines += other.total_processed_lines
+        self.total_valid_requests += other.total_valid_requests
+        self.threats.extend(other.threats)
+
+    @staticmethod
+    def format_threat(entry: Dict) -> Dict:
+        """整理威胁记录为JSON友好的结构"""
+        return {
+            "threat_level": entry["threat_level"],
+            "timestamp": entry["timestamp"],
+            "client_ip": entry["client_ip"],
+            "threat_details": entry["threat_details"],
+            "raw_payload": entry["raw_log"].strip()[:100],  # 截取前100字符
+            "full_raw_log": entry["raw_log"],  # 保留完整原始日志
+            "http_method": entry["http_method"],
+            "request_path": entry["request_path"],
+            "query_string": entry["query_string"]
+        }
+
+    def memory_bytes(self) -> int:
+        """估算占用的内存（字节），供结果缓存计算上限"""
+        return self.threats.memory_bytes()
+
+    def summary(self) -> Dict:
+        """统计信息"""
+        return {
+            "total_processed_lines": self.total_processed_lines,
+            "total_valid_requests": self.total_valid_requests,
+            "total_threat_requests": len(self.threats)
+        }
+
+    def build(self) -> Dict:
+        """生成完整威胁报告：统计信息 + 全部威胁（此时才从列式存储还原威胁条目）"""
+        return {
+            "audit_summary": self.summary(),
+            "threat_details": [self.format_threat(entry) for entry in self.threats.records()]
+        }
+
+    def _ranked_groups(self, dedupe: bool, top: Optional[int] = None) -> Tuple[int, List[List[int]]]:
+        """
+        按严重程度排序的威胁分组（每组为行号列表，第一行作为代表）
+        只读取列式存储中的编码列，不还原记录、不读取原始日志
+        dedupe为True时，同一IP的相同威胁特征组合合并为一组
+        :param top: 只需要排在最前的top组时用堆选出，不对全部分组排序
+        :return: （分组总数, 排序后的分组）
+        """
+        threats = self.threats
+        groups: Dict[tuple, List[int]] = {}
+        for row in range(len(threats)):
+            key = (threats.value(row, "client_ip"), threats.value(row, "threat_details")) if dedupe else row
+            groups.setdefault(key, []).append(row)
+
+        def rank(rows: List[int]) -> tuple:
+            return (-self.SEVERITY_RANK.get(threats.value(rows[0], "threat_level"), 0),
+                    -len(threats.value(rows[0], "threat_details")),
+                    rows[0])
+
+        if top is not None and top < len(groups):
+            return len(groups), heapq.nsmallest(top, groups.values(), key=rank)
+        return len(groups), sorted(groups.values(), key=rank)
+
+    def build_page(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   fields: Optional[List[str]] = None, max_bytes: Optional[int] = None,
+                   dedupe: bool = True) -> Dict:
+        """
+        生成分页的威胁报告：按严重程度排序，每页不超过limit条且序列化后不超过max_bytes字节
+        :param limit: 每页条数，默认config.LOG_REPORT_PAGE_SIZE
+        :param cursor: 上一页返回的next_cursor，默认从第一条开始
+        :param fields: 返回的字段，默认DEFAULT_FIELDS（不含完整原始日志）
+        :param max_bytes: 本页威胁条目的字节预算，默认config.LOG_REPORT_MAX_BYTES，0表示不限制
+        :param dedupe: 同一IP的相同威胁特征组合只返回一条（附出现次数和首末次时间）
+        """
+        try:
+            limit = config.LOG_REPORT_PAGE_SIZE if limit is None else int(limit)
+        except (TypeError, ValueError):
+            raise ValueError(f"无效的每页条数: {limit}")
+        if limit <= 0:
+            raise ValueError(f"每页条数必须大于0: {limit}")
+        max_bytes = config.LOG_REPORT_MAX_BYTES if max_bytes is None else int(max_bytes)
+        if max_bytes < 0:
+            raise ValueError(f"字节预算不能为负数: {max_bytes}")
+        fields = list(fields) if fields else list(self.DEFAULT_FIELDS)
+        unknown = [field for field in fields if field not in self.PAGE_FIELDS]
+        if unknown:
+            raise ValueError(f"不支持的字段: {', '.join(unknown)}，可选: {', '.join(self.PAGE_FIELDS)}")
+        # 游标只能是上一页返回的next_cursor（非负整数），不接受负数等会导致原地翻页的值
+        cursor = "" if cursor is None else str(cursor).strip()
+        if cursor and not cursor.isdigit():
+            raise ValueError(f"无效的分页游标: {cursor}（应为上一页返回的next_cursor）")
+        start = int(cursor) if cursor else 0
+
+        total_groups, groups = self._ranked_groups(dedupe, top=start + limit)
+        page_groups = groups[start:start + limit]
+        items, used_bytes = [], 0
+        entries = self.threats.records(rows[0] for rows in page_groups)
+        for rows, entry in zip(page_groups, entries):
+            item = self.format_threat(entry)
+            if dedupe:
+                timestamps = [self.threats.timestamp(row) for row in rows]
+                item.update(occurrences=len(rows), first_seen=min(timestamps), last_seen=max(timestamps))
+            item = {field: item[field] for field in fields if field in item}
+            size = len(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+            # 预算不足时截止（至少返回一条，保证能继续翻页）
+            if max_bytes and items and used_bytes + size > max_bytes:
+                break
+            items.append(item)
+            used_bytes += size
+        entries.close()
+
+        end = start + len(items)
+        return {
+            "audit_summary": self.summary(),
+            "threat_details": items,
+            "page": {
+                "cursor": str(start),
+                "returned": len(items),
+                "total_items": total_groups,
+                "deduplicated": dedupe,
+                "bytes": used_bytes,
+                "next_cursor": str(end) if end < total_groups else None
+            }
+        }
+
+
+def resolve_log_paths(log_file_path: str) -> List[str]:
+    """
+    解析日志路径：支持通配符匹配多个轮转日志（如 geoserver.log*），按修改时间从旧到新排序
+    """
+    if not any(ch in log_file_path for ch in "*?["):
+        return [log_file_path]
+    paths = sorted(glob.glob(log_file_path), key=os.path.getmtime)
+    if not paths:
+        raise FileNotFoundError(log_file_path)
+    return paths
+
+
+def split_file_ranges(log_file_path: str, target_size: int,
+                      start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """把文件的[start, end)区间按行边界切分为大约target_size字节的若干区间"""
+    if end is None:
+        end = os.path.getsize(log_file_path)
+    bounds = [start]
+    with open(log_file_path, "rb") as f:
+        position = start + target_size
+        while position < end:
+            f.seek(position)
+            f.readline()  # 跳到下一行行首
+            boundary = f.tell()
+            if boundary >= end:
+                break
+            bounds.append(boundary)
+            position = boundary + target_size
+    bounds.append(end)
+    return [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def _analyze_chunk(task: Tuple[str, int, int, type]) -> Dict:
+    """
+    进程池任务：解析文件的一个区间，返回部分报告和跨块配对所需的边界信息
+    task的最后一项是报告类（与调用方的报告同类型，需实现add/merge和total_processed_lines）
+    """
+    log_file_path, start, end, report_class = task
+    parser = GeoServerLogParser(track_boundary=True)
+    report = report_class()
+    for entry in parser.iter_ranges([(log_file_path, start, end)]):
+        report.add(entry)
+    report.total_processed_lines = parser.lines_processed
+    return {
+        "report": report,
+        "boundary_completions": parser.boundary_completions,
+        "pending": parser.request_cache.items(),
+        "last_epoch": parser.last_epoch
+    }
+
+
+def merge_chunk_results(chunk_results: Iterable[Dict], report: ThreatReportBuilder,
+                        carry: RequestCorrelationCache) -> None:
+    """
+    按文件顺序把各区间的部分报告合并到report中，补做跨区间的请求/耗时日志配对，
+    统计结果与顺序解析一致（威胁条目的先后顺序按区间排列）；
+    同一请求标识的多个请求同时跨越区间边界时，耗时的分配可能与顺序解析不同（两者都是按先进先出推测的配对）
+    :param carry: 前面各区间遗留、尚未等到耗时日志的请求，合并过程中原地更新
+    """
+    for chunk in chunk_results:
+        report.merge(chunk["report"])
+        for request_key, entry in chunk["boundary_completions"]:
+            # 先按这条耗时日志的时间淘汰超时的遗留请求，与顺序解析时一致
+            for expired in carry.expire(entry.get("epoch")):
+                report.add(expired)
+            cached = carry.pop(request_key)
+            if cached is not None:
+                cached["response_time_ms"] = entry["response_time_ms"]
+                report.add(cached)
+            else:
+                report.add(entry)
+        for expired in carry.expire(chunk["last_epoch"]):
+            report.add(expired)
+        for request_key, entry in chunk["pending"]:
+            for evicted in carry.add(request_key, entry):
+                report.add(evicted)
+
+
+def parse_ranges(ranges: List[Tuple[str, int, int]], report: ThreatReportBuilder,
+                 carry: RequestCorrelationCache, workers: Optional[int] = None) -> None:
+    """
+    按顺序解析若干文件区间（视为连续的日志流），结果累加到report中
+    report可以是ThreatReportBuilder或其他实现了add/merge和total_processed_lines的收集器
+    尚未等到耗时日志的请求留在carry中（原地更新），由调用方决定兜底输出还是保留到下次
+    总大小超过LOG_PARALLEL_MIN_BYTES时，按行边界切块后用进程池（spawn启动）并行解析
+    """
+    if workers is None:
+        workers = config.LOG_ANALYSIS_WORKERS or os.cpu_count() or 1
+    total_size = sum(end - start for _, start, end in ranges)
+
+    if workers <= 1 or total_size < config.LOG_PARALLEL_MIN_BYTES:
+        parser = GeoServerLogParser()
+        parser.request_cache = carry
+        for entry in parser.iter_ranges(ranges):
+            report.add(entry)
+        report.total_processed_lines += parser.lines_processed
+        return
+
+    # 每个进程分到若干块，块太小时进程间通信开销占比过高
+    target_size = max(total_size // (workers * 4), config.LOG_PARALLEL_CHUNK_MIN_BYTES)
+    tasks = [(path, lo, hi, type(report)) for path, start, end in ranges
+             for lo, hi in split_file_ranges(path, target_size, start, end)]
+    # spawn启动：与工具进程池一致，主进程是多线程的Flask服务，fork可能复制其他线程持有的锁（日志队列、缓存）
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker_logging, initargs=(get_log_queue(),)) as executor:
+        merge_chunk_results(executor.map(_analyze_chunk, tasks), report, carry)
+
+
+def build_threat_report(log_paths: List[str], workers: Optional[int] = None) -> ThreatReportBuilder:
+    """解析一个或多个日志文件（按顺序视为连续的日志流）并构建威胁报告"""
+    report = ThreatReportBuilder()
+    carry = RequestCorrelationCache()
+    parse_ranges([(path, 0, os.path.getsize(path)) for path in log_paths], report, carry, workers)
+    # 兜底：始终没有等到耗时日志的请求
+    for entry in carry.drain():
+        report.add(entry)
+    return report
+
+
+_report_cache: Optional[ResultCache] = None
+_report_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ResultCache:
+    """分析结果缓存（进程内共享，首次使用时按配置创建）"""
+    global _report_cache
+    if _report_cache is None:
+        with _report_cache_lock:
+            if _report_cache is None:
+                _report_cache = ResultCache(config.LOG_RESULT_CACHE_ENTRIES, config.LOG_RESULT_CACHE_MAX_BYTES)
+    return _report_cache
+
+
+def report_cache_key(log_paths: List[str]) -> tuple:
+    """分析结果的缓存键：各文件的（路径, 大小, 修改时间）+ 解析版本 + 规则版本 + 配对参数"""
+    files = []
+    for path in log_paths:
+        stat = os.stat(path)
+        files.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return (tuple(files), PARSER_VERSION, get_threat_matcher("geoserver").version,
+            config.LOG_CORRELATION_TTL_SECONDS, config.LOG_CORRELATION_MAX_ENTRIES)
+
+
+def get_threat_report(log_paths: List[str]) -> ThreatReportBuilder:
+    """带缓存的build_threat_report：文件未变化时直接返回上次的报告（报告只读，不可修改）"""
+    cache = get_report_cache()
+    key = report_cache_key(log_paths)
+    report = cache.get(key)
+    if report is None:
+        report = build_threat_report(log_paths)
+        cache.put(key, report, size=report.memory_bytes())
+    return report
+
+
+class LogFollower:
+    """
+    跟踪模式：按日志路径持久化读取位置，每次只解析新追加的内容；支持日志轮转（重命名为.1）和截断
+    - 状态文件（JSON）只保存读取位置（inode+字节偏移+文件头摘要）、累计计数和尚未配对的请求（有上限），
+      大小与历史长度无关，每次整体重写
+    - 威胁记录逐条追加到同名的 .threats.jsonl 文件（内联原始日志，不受源文件轮转影响），已写入的部分不再改写
+    - 进程内缓存已读入的威胁记录，之后每次只读取威胁文件新追加的部分
+    """
+
+    STATE_VERSION = 4
+    HEAD_FINGERPRINT_BYTES = 1024  # 文件开头用于识别同一文件的字节数（防止inode被复用）
+
+    _lock = threading.Lock()
+    _threat_stores: Dict[str, Tuple[str, LogRecordStore, int]] = {}  # 威胁文件路径 -> （文件代号, 已读入的记录, 已读到的字节数）
+
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+
+    def _state_path(self, log_file_path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(log_file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.state_dir, f"{digest}.json")
+
+    def _threats_path(self, log_file_path: str) -> str:
+        return self._state_path(log_file_path)[:-len(".json")] + ".threats.jsonl"
+
+    def _load_state(self, log_file_path: str) -> Optional[Dict]:
+        try:
+            with open(self._state_path(log_file_path), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return state if state.get("version") == self.STATE_VERSION else None
+
+    def _save_state(self, log_file_path: str, state: Dict) -> None:
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_path = self._state_path(log_file_path)
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, state_path)
+
+    def _append_threats(self, threats_path: str, committed: int, threats: LogRecordStore) -> int:
+        """
+        把新的威胁记录追加到威胁文件，返回追加后的文件大小
+        :param committed: 状态文件中记录的威胁文件大小，之后的内容（上次写入后未保存状态就中断）先截掉
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(threats_path, "ab") as f:
+            f.truncate(committed)
+            f.seek(committed)
+            for record in threats.detached_records():
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            return f.tell()
+
+    def _load_threats(self, threats_path: str, threats_id: str, size: int) -> LogRecordStore:
+        """
+        返回威胁文件前size字节中的全部记录（只读取进程内缓存之后新增的部分）
+        :param threats_id: 威胁文件的代号，状态重建时更换，进程内缓存与之不符时从头读取
+        """
+        cached_id, store, loaded = self._threat_stores.get(threats_path, (None, None, 0))
+        if cached_id != threats_id or loaded > size:
+            store, loaded = LogRecordStore(), 0
+        if size > loaded:
+            with open(threats_path, "rb") as f:
+                f.seek(loaded)
+                for line in f.read(size - loaded).splitlines():
+                    if line.strip():
+                        store.append(json.loads(line))
+        self._threat_stores[threats_path] = (threats_id, store, size)
+        return store
+
+    @staticmethod
+    def _head_digest(log_file_path: str, length: int) -> str:
+        with open(log_file_path, "rb") as f:
+            return hashlib.sha1(f.read(length)).hexdigest()
+
+    @staticmethod
+    def _complete_end(log_file_path: str, start: int, size: int) -> int:
+        """返回[start, size)内最后一个换行符之后的位置，正在写入的半行留到下次读取"""
+        with open(log_file_path, "rb") as f:
+            position = size
+            while position > start:
+                block_start = max(start, position - READ_CHUNK_SIZE)
+                f.seek(block_start)
+                index = f.read(position - block_start).rfind(b"\n")
+                if index >= 0:
+                    return block_start + index + 1
+                position = block_start
+        return start
+
+    @classmethod
+    def _is_same_file(cls, log_file_path: str, stat: os.stat_result, cursor: Dict) -> bool:
+        if stat.st_ino != cursor["inode"]:
+            return False
+        head_length = min(cursor["head_length"], stat.st_size)
+        return (head_length == cursor["head_length"]
+                and cls._head_digest(log_file_path, head_length) == cursor["head_digest"])
+
+    @classmethod
+    def plan_ranges(cls, log_file_path: str, cursor: Optional[Dict]) -> Tuple[str, List[Tuple[str, int, int]], Dict]:
+        """
+        根据上次的读取位置，计算本次需要解析的文件区间
+        :param cursor: 上次返回的读取位置（inode、offset、文件头摘要），首次为None
+        :return: （事件: initial/appended/truncated/rotated, 待解析区间, 新的读取位置）
+        """
+        stat = os.stat(log_file_path)
+        ranges: List[Tuple[str, int, int]] = []
+        event, offset = "initial", 0
+
+        if cursor is not None:
+            offset = cursor["offset"]
+            if cls._is_same_file(log_file_path, stat, cursor) and stat.st_size >= offset:
+                event = "appended"
+            elif stat.st_ino == cursor["inode"]:
+                # 同一文件但内容变短或开头变化：被截断后重新写入
+                event, offset = "truncated", 0
+            else:
+                # 文件被轮转：先读完旧文件（通常已重命名为.1）剩余的部分，再从头读新文件
+                event = "rotated"
+                rotated_path = f"{log_file_path}.1"
+                if os.path.exists(rotated_path):
+                    rotated_stat = os.stat(rotated_path)
+                    if (cls._is_same_file(rotated_path, rotated_stat, cursor)
+                            and rotated_stat.st_size > offset):
+                        ranges.append((rotated_path, offset, rotated_stat.st_size))
+                offset = 0
+
+        end = cls._complete_end(log_file_path, offset, stat.st_size)
+        if end > offset:
+            ranges.append((log_file_path, offset, end))
+
+        head_length = min(cls.HEAD_FINGERPRINT_BYTES, end)
+        new_cursor = {
+            "inode": stat.st_ino,
+            "offset": end,
+            "head_length": head_length,
+            "head_digest": cls._head_digest(log_file_path, head_length)
+        }
+        return event, ranges, new_cursor
+
+    def follow(self, log_file_path: str) -> Tuple[ThreatReportBuilder, Dict]:
+        """解析自上次调用以来新增的日志，返回（累计报告, 本次增量信息）"""
+        with self._lock:
+            state = self._load_state(log_file_path)
+            threats_path = self._threats_path(log_file_path)
+            if state is not None and not (os.path.exists(threats_path)
+                                          and os.path.getsize(threats_path) >= state["threats_bytes"]):
+                state = None  # 威胁文件丢失或不完整，重新开始跟踪
+            event, ranges, cursor = self.plan_ranges(log_file_path, state)
+
+            carry = RequestCorrelationCache()
+            if state is not None:
+                carry.load(state["request_cache"])
+            delta = ThreatReportBuilder()
+            parse_ranges(ranges, delta, carry)
+
+            # 只追加本次新增的威胁，再读入进程内缓存之后新增的部分
+            committed = state["threats_bytes"] if state is not None else 0
+            threats_id = state["threats_id"] if state is not None else uuid.uuid4().hex
+            threats_bytes = self._append_threats(threats_path, committed, delta.threats)
+            threats = self._load_threats(threats_path, threats_id, threats_bytes)
+
+            report = ThreatReportBuilder()
+            report.total_processed_lines = (state["total_processed_lines"] if state else 0) + delta.total_processed_lines
+            report.total_valid_requests = (state["total_valid_requests"] if state else 0) + delta.total_valid_requests
+            report.threats = threats
+
+            # 返回结果包含尚未等到耗时日志的请求（与完整解析一致），但不写入持久化的累计结果；
+            # 未配对的威胁单独存放，与已落盘的威胁拼成只读视图，不复制累计的威胁记录
+            result = ThreatReportBuilder()
+            result.total_processed_lines = report.total_processed_lines
+            result.total_valid_requests = report.total_valid_requests + len(carry)
+            pending_threats = LogRecordStore()
+            for entry in carry.values():
+                if entry.get("is_threat"):
+                    pending_threats.append(entry)
+            result.threats = ChainedRecordStore(threats, pending_threats) if len(pending_threats) else threats
+            summary = result.summary()
+            previous = state.get("last_audit_summary", {}) if state else {}
+
+            self._save_state(log_file_path, {
+                "version": self.STATE_VERSION,
+                "log_file_path": os.path.abspath(log_file_path),
+                **cursor,
+                "request_cache": carry.detached_items(),
+                "total_processed_lines": report.total_processed_lines,
+                "total_valid_requests": report.total_valid_requests,
+                "threats_id": threats_id,
+                "threats_bytes": threats_bytes,
+                "last_audit_summary": summary
+            })
+
+        # 本次增量：与上一次返回的累计结果相比
+        follow_info = {
+            "event": event,
+            "offset": cursor["offset"],
+            "new_bytes": sum(hi - lo for _, lo, hi in ranges)
+        }
+        for field, value in summary.items():
+            follow_info[field.replace("total_", "new_")] = value - previous.get(field, 0)
+        return result, follow_info
 
 
 class LogAnalysisTools:
     """日志分析工具类"""
     
+    @staticmethod
+    def _error_report(message: str) -> Dict:
+        return {
+            "error": message,
+            "audit_summary": {
+                "total_processed_lines": 0,
+                "total_valid_requests": 0,
+                "total_threat_requests": 0
+            },
+            "threat_details": []
+        }
+    
+    @staticmethod
+    def _analyze(log_file_path=None, follow=False, **page_options) -> Dict:
+        """
+        分析实现（不带日志装饰器，供两个工具共用，避免摘要工具重复记录完整结果）
+        非跟踪模式下，文件未变化时复用缓存的报告，只重新生成请求的那一页
+        """
+        # 使用默认日志文件路径
+        if log_file_path is None:
+            log_file_path = config.DEFAULT_LOG_FILE_PATH
+        
+        follow_info = None
+        if follow:
+            if any(ch in log_file_path for ch in "*?["):
+                raise ValueError("跟踪模式不支持通配符路径")
+            report, follow_info = LogFollower(config.LOG_FOLLOW_STATE_DIR).follow(log_file_path)
+        else:
+            # 流式解析（大文件自动切块并行），逐条记录累加到报告中；结果按文件大小和修改时间缓存
+            report = get_threat_report(resolve_log_paths(log_file_path))
+        
+        # 只返回排序后的一页，避免整份威胁列表进入模型上下文
+        result = report.build_page(**page_options)
+        if follow_info is not None:
+            result["follow"] = follow_info
+        return result
+    
     @staticmethod
     @log_tool_call
-    def analyze_geoserver_log(log_file_path=None):
+    def analyze_geoserver_log(log_file_path=None, follow=False, limit=None, cursor=None,
+                              fields=None, max_bytes=None, dedupe=True):
         """
         分析GeoServer日志文件，识别潜在威胁
         
         参数:
-            log_file_path (str): 日志文件路径，默认使用配置中的路径
+            log_file_path (str): 日志文件路径，默认使用配置中的路径；支持通配符匹配多个轮转日志
+            follow (bool): 跟踪模式，只解析上次调用以来新增的内容，返回累计结果
+            limit (int): 每页威胁条数，默认config.LOG_REPORT_PAGE_SIZE
+            cursor (str): 翻页游标（上一页返回的page.next_cursor）
+            fields (list): 返回的威胁字段，默认不含full_raw_log
+            max_bytes (int): 本页威胁条目的字节预算，默认config.LOG_REPORT_MAX_BYTES，0表示不限制
+            dedupe (bool): 同一IP的相同威胁特征组合只返回一条，默认True
         
         返回:
-            dict: 分析结果，包含威胁统计和详细信息
+            dict: 分析结果，包含威胁统计和按严重程度排序的一页威胁详情
         """
         try:
-            # 使用默认日志文件路径
-            if log_file_path is None:
-                log_file_path = config.DEFAULT_LOG_FILE_PATH
-            
-            # 初始化解析器
-            parser = GeoServerLogParser()
-            
-            # 读取文件内容
-            with open(log_file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # 执行解析
-            results = parser.parse_logs(content)
-
-            # 筛选出所有威胁请求，并整理成易读的结构
-            threat_count = 0
-            threat_entries = []  # 存储所有威胁请求的结构化数据
-            for entry in results:
-                if entry.get("is_threat"):
-                    threat_count += 1
-                    # 整理字段为JSON友好的结构
-                    threat_item = {
-                        "threat_level": entry["threat_level"],
-                        "timestamp": entry["timestamp"],
-                        "client_ip": entry["client_ip"],
-                        "threat_details": entry["threat_details"],
-                        "raw_payload": entry["raw_log"].strip()[:100],  # 截取前100字符
-                        "full_raw_log": entry["raw_log"],  # 保留完整原始日志
-                        "http_method": entry["http_method"],
-                        "request_path": entry["request_path"],
-                        "query_string": entry["query_string"]
-                    }
-                    threat_entries.append(threat_item)
-
-            # 封装成更易读的结构，包含统计信息 + 威胁列表
-            threat_report = {
-                "audit_summary": {
-                    "total_processed_lines": len(content.splitlines()),
-                    "total_valid_requests": len(results),
-                    "total_threat_requests": threat_count
-                },
-                "threat_details": threat_entries
-            }
-            
-            return threat_report
-            
+            return LogAnalysisTools._analyze(log_file_path, follow, limit=limit, cursor=cursor,
+                                             fields=fields, max_bytes=max_bytes, dedupe=dedupe)
         except FileNotFoundError:
-            return {
-                "error": f"日志文件不存在: {log_file_path}",
-                "audit_summary": {
-                    "total_processed_lines": 0,
-                    "total_valid_requests": 0,
-                    "total_threat_requests": 0
-                },
-                "threat_details": []
-            }
+            return LogAnalysisTools._error_report(f"日志文件不存在: {log_file_path or config.DEFAULT_LOG_FILE_PATH}")
         except Exception as e:
-            return {
-                "error": f"分析失败: {str(e)}",
-                "audit_summary": {
-                    "total_processed_lines": 0,
-                    "total_valid_requests": 0,
-                    "total_threat_requests": 0
-                },
-                "threat_details": []
-            }
+            return LogAnalysisTools._error_report(f"分析失败: {str(e)}")
     
     @staticmethod
     @log_tool_call
-    def analyze_geoserver_log_summarize(log_file_path=None):
+    def analyze_geoserver_log_summarize(log_file_path=None, follow=False):
         """
         分析GeoServer日志文件，返回威胁摘要
         
         参数:
             log_file_path (str): 日志文件路径，默认使用配置中的路径
+            follow (bool): 跟踪模式，只解析上次调用以来新增的内容，返回累计结果
         
         返回:
             dict: 分析摘要，包含威胁统计和关键信息
         """
         try:
-            # 调用完整分析方法
-            full_report = LogAnalysisTools.analyze_geoserver_log(log_file_path)
-            
-            # 如果有错误，直接返回
-            if "error" in full_report:
-                return full_report
+            # 只取排序后的前5个威胁（堆选出，不还原其余威胁条目）
+            report = LogAnalysisTools._analyze(log_file_path, follow, limit=5)
             
             # 生成摘要
             summary = {
-                "audit_summary": full_report.get("audit_summary", {}),
+                "audit_summary": report.get("audit_summary", {}),
                 "top_threats": [],
                 "threat_summary": ""
             }
+            if "follow" in report:
+                summary["follow"] = report["follow"]
             
             # 提取前5个威胁作为摘要
-            threat_details = full_report.get("threat_details", [])
-            top_threats = threat_details[:5]
+            top_threats = report.get("threat_details", [])
             summary["top_threats"] = top_threats
             
             # 生成威胁摘要文本
@@ -381,6 +1363,8 @@ class LogAnalysisTools:
             
             return summary
             
+        except FileNotFoundError:
+            return LogAnalysisTools._error_report(f"日志文件不存在: {log_file_path or config.DEFAULT_LOG_FILE_PATH}")
         except Exception as e:
             return {
                 "error": f"分析失败: {str(e)}",
@@ -1,25 +1,90 @@
+import time
+import random
+import inspect
+import reprlib
 import logging
 from functools import wraps
+from config import config
 
-# 获取全局logger（复用config.py的日志配置）
+# 获取全局logger（复用config.py的日志配置：队列异步写入、按大小轮转）
 logger = logging.getLogger(__name__)
 
+# 入参/出参的截断渲染：按嵌套层级、容器长度和字符串长度截断，
+# 只遍历需要显示的部分，整份日志分析结果或HTTP响应体也不会被完整转成字符串
+_value_repr = reprlib.Repr()
+_value_repr.maxlevel = 4
+_value_repr.maxdict = 20
+_value_repr.maxlist = 20
+_value_repr.maxtuple = 20
+_value_repr.maxset = 20
+_value_repr.maxstring = 300
+_value_repr.maxother = 300
+_value_repr.maxlong = 100
+
+
+def render_value(value, max_chars: int = None) -> str:
+    """把入参/出参渲染为长度受限的字符串"""
+    text = _value_repr.repr(value)
+    max_chars = config.TOOL_LOG_MAX_CHARS if max_chars is None else max_chars
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}...[已截断 {len(text) - max_chars} 个字符]"
+    return text
+
+
+def _sampled(tool_name: str) -> bool:
+    """按config.TOOL_LOG_SAMPLE_RATES决定本次调用是否记录日志"""
+    rate = config.TOOL_LOG_SAMPLE_RATES.get(tool_name, 1.0)
+    return rate >= 1 or random.random() < rate
+
+
 def log_tool_call(func):
     """
-    装饰器：记录工具函数的调用信息（入参、出参、调用时间、异常）
+    装饰器：记录工具函数的调用信息（入参、出参、耗时、异常）
+    日志由后台线程写入文件，入参/出参截断渲染，高频工具按采样率记录（异常始终记录）
     """
+    def before_call(args, kwargs) -> bool:
+        log_call = logger.isEnabledFor(logging.INFO) and _sampled(func.__name__)
+        # 记录函数开始调用
+        if log_call:
+            logger.info("工具函数 %s 开始调用 | 入参: args=%s, kwargs=%s",
+                        func.__name__, render_value(args), render_value(kwargs))
+        return log_call
+
+    def after_call(log_call: bool, started: float, result) -> None:
+        # 记录函数调用成功
+        if log_call:
+            logger.info("工具函数 %s 调用成功 | 耗时: %.1fms | 出参: %s",
+                        func.__name__, (time.perf_counter() - started) * 1000, render_value(result))
+
+    def on_error(e: Exception) -> None:
+        # 记录函数调用异常
+        logger.error(f"工具函数 {func.__name__} 调用失败 | 异常信息: {str(e)}", exc_info=True)
+
+    if inspect.iscoroutinefunction(func):
+        # 异步工具：包装后仍是协程函数，注册表据此把它提交到事件循环执行
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            log_call = before_call(args, kwargs)
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                on_error(e)
+                raise
+            after_call(log_call, started, result)
+            return result
+        return async_wrapper
+
     @wraps(func)  # 保留原函数的元信息（如函数名、文档字符串）
     def wrapper(*args, **kwargs):
-        # 记录函数开始调用
-        logger.info(f"工具函数 {func.__name__} 开始调用 | 入参: args={args}, kwargs={kwargs}")
+        log_call = before_call(args, kwargs)
+        started = time.perf_counter()
         try:
             # 执行原函数
             result = func(*args, **kwargs)
-            # 记录函数调用成功
-            logger.info(f"工具函数 {func.__name__} 调用成功 | 出参: {result}")
-            return result
         except Exception as e:
-            # 记录函数调用异常
-            logger.error(f"工具函数 {func.__name__} 调用失败 | 异常信息: {str(e)}", exc_info=True)
+            on_error(e)
             raise  # 抛出异常，不影响上层逻辑处理
-    return wrapper
\ No newline at end of file
+        after_call(log_call, started, result)
+        return result
+    return wrapper
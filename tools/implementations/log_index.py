@@ -0,0 +1,334 @@
+"""
+GeoServer日志索引 - 解析结果写入本地SQLite数据库，按时间、客户端IP、请求类型、威胁等级建索引
+增量构建：复用跟踪模式的读取位置（inode+偏移+文件头摘要），每次只解析新追加的日志；
+筛选和聚合查询直接在索引上执行，不再重新解析整个日志文件
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from .log_decorator import log_tool_call
+from .log_analysis_tools import (
+    LogFollower, LogRecordStore, RequestCorrelationCache, parse_ranges
+)
+from config import config
+
+
+class RecordCollector:
+    """记录收集器：保留全部解析记录（列式存储），接口与ThreatReportBuilder一致，可用于并行解析"""
+
+    def __init__(self):
+        self.total_processed_lines = 0
+        self.records = LogRecordStore()
+
+    def add(self, entry: Dict) -> None:
+        self.records.append(entry)
+
+    def merge(self, other: "RecordCollector") -> None:
+        self.total_processed_lines += other.total_processed_lines
+        self.records.extend(other.records)
+
+
+class GeoServerLogIndex:
+    """GeoServer日志的SQLite索引"""
+
+    # 2: 每条记录都保存原始日志（source_file+source_offset在日志轮转后会指向错误的文件，只作参考）
+    SCHEMA_VERSION = 2
+
+    # 写入requests表的字段（顺序与INSERT语句一致）
+    RECORD_FIELDS = (
+        "timestamp", "epoch", "client_ip", "http_method", "request_path", "query_string",
+        "request_type", "user_agent", "referer", "log_level", "log_module", "response_time_ms",
+        "geo_service", "geo_action", "geo_layer", "geo_version", "source_file", "source_offset",
+        "is_threat", "threat_level", "threat_details", "raw_log"
+    )
+
+    # 允许分组的维度 -> SQL表达式（白名单，防止拼接任意SQL）
+    GROUP_BY_EXPRESSIONS = {
+        "client_ip": "client_ip",
+        "request_type": "request_type",
+        "threat_level": "threat_level",
+        "request_path": "request_path",
+        "log_module": "log_module",
+        "hour": "substr(timestamp, 1, 13)",
+        "day": "substr(timestamp, 1, 10)"
+    }
+
+    ORDER_BY_EXPRESSIONS = {
+        "time": "epoch DESC, id DESC",
+        "response_time": "response_time_ms DESC, id DESC",
+        "count": "request_count DESC",
+    }
+
+    _lock = threading.Lock()
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_schema(connection)
+        return connection
+
+    def _ensure_schema(self, connection: sqlite3.Connection) -> None:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == self.SCHEMA_VERSION:
+            return
+        # 结构变更后索引可以从日志重建，直接丢弃旧表
+        connection.executescript("""
+            DROP TABLE IF EXISTS sources;
+            DROP TABLE IF EXISTS requests;
+            CREATE TABLE sources (
+                log_path TEXT PRIMARY KEY,
+                inode INTEGER,
+                read_offset INTEGER,
+                head_length INTEGER,
+                head_digest TEXT,
+                processed_lines INTEGER,
+                request_cache TEXT,
+                updated_at REAL
+            );
+            CREATE TABLE requests (
+                id INTEGER PRIMARY KEY,
+                log_path TEXT NOT NULL,
+                pending INTEGER NOT NULL DEFAULT 0,
+                timestamp TEXT,
+                epoch INTEGER,
+                client_ip TEXT,
+                http_method TEXT,
+                request_path TEXT,
+                query_string TEXT,
+                request_type TEXT,
+                user_agent TEXT,
+                referer TEXT,
+                log_level TEXT,
+                log_module TEXT,
+                response_time_ms INTEGER,
+                geo_service TEXT,
+                geo_action TEXT,
+                geo_layer TEXT,
+                geo_version TEXT,
+                source_file TEXT,
+                source_offset INTEGER,
+                is_threat INTEGER,
+                threat_level TEXT,
+                threat_details TEXT,
+                raw_log TEXT
+            );
+            CREATE INDEX idx_requests_log_path ON requests(log_path, pending);
+            CREATE INDEX idx_requests_timestamp ON requests(timestamp);
+            CREATE INDEX idx_requests_epoch ON requests(epoch);
+            CREATE INDEX idx_requests_client_ip ON requests(client_ip, timestamp);
+            CREATE INDEX idx_requests_request_type ON requests(request_type, timestamp);
+            CREATE INDEX idx_requests_threat_level ON requests(threat_level, timestamp);
+        """)
+        connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        connection.commit()
+
+    def _row_values(self, log_path: str, entry: Dict, pending: bool) -> Tuple:
+        values = [log_path, int(pending)]
+        for field in self.RECORD_FIELDS:
+            value = entry.get(field)
+            if field == "threat_details":
+                value = json.dumps(value or [], ensure_ascii=False)
+            elif field == "is_threat":
+                value = int(bool(value))
+            values.append(value)
+        return tuple(values)
+
+    def update(self, log_file_path: str) -> Dict:
+        """
+        增量更新索引：只解析上次更新以来新增的日志（自动处理轮转和截断）
+        尚未等到耗时日志的请求以pending=1写入（查询时可见），下次更新时替换为配对后的结果
+        """
+        started = time.perf_counter()
+        log_path = os.path.abspath(log_file_path)
+        with self._lock:
+            connection = self._connect()
+            try:
+                source = connection.execute(
+                    "SELECT * FROM sources WHERE log_path = ?", (log_path,)
+                ).fetchone()
+                cursor = None
+                if source is not None:
+                    cursor = {"inode": source["inode"], "offset": source["read_offset"],
+                              "head_length": source["head_length"], "head_digest": source["head_digest"]}
+                event, ranges, new_cursor = LogFollower.plan_ranges(log_file_path, cursor)
+
+                collector = RecordCollector()
+                carry = RequestCorrelationCache()
+                if source is not None:
+                    # 与跟踪模式一致：轮转、截断前已写入索引的记录保留，继续累加
+                    carry.load(json.loads(source["request_cache"]))
+                    collector.total_processed_lines = source["processed_lines"]
+                parse_ranges(ranges, collector, carry)
+
+                columns = ", ".join(("log_path", "pending") + self.RECORD_FIELDS)
+                placeholders = ", ".join("?" * (len(self.RECORD_FIELDS) + 2))
+                insert = f"INSERT INTO requests ({columns}) VALUES ({placeholders})"
+                with connection:
+                    if source is None:
+                        connection.execute("DELETE FROM requests WHERE log_path = ?", (log_path,))
+                    else:
+                        connection.execute("DELETE FROM requests WHERE log_path = ? AND pending = 1", (log_path,))
+                    connection.executemany(insert, (
+                        self._row_values(log_path, entry, False) for entry in collector.records.records()
+                    ))
+                    connection.executemany(insert, (
+                        self._row_values(log_path, entry, True) for entry in carry.values()
+                    ))
+                    connection.execute(
+                        "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (log_path, new_cursor["inode"], new_cursor["offset"], new_cursor["head_length"],
+                         new_cursor["head_digest"], collector.total_processed_lines,
+                         json.dumps(carry.detached_items(), ensure_ascii=False), time.time())
+                    )
+                total = connection.execute(
+                    "SELECT COUNT(*) FROM requests WHERE log_path = ?", (log_path,)
+                ).fetchone()[0]
+            finally:
+                connection.close()
+
+        return {
+            "event": event,
+            "offset": new_cursor["offset"],
+            "new_bytes": sum(hi - lo for _, lo, hi in ranges),
+            "new_records": len(collector.records),
+            "total_processed_lines": collector.total_processed_lines,
+            "indexed_requests": total,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def query(self, log_file_path: str, start_time: Optional[str] = None, end_time: Optional[str] = None,
+              client_ip: Optional[str] = None, request_type: Optional[str] = None,
+              threat_level: Optional[str] = None, threats_only: bool = False,
+              min_response_time_ms: Optional[int] = None, group_by: Optional[str] = None,
+              order_by: str = "time", limit: int = 20) -> Dict:
+        """
+        在索引上执行筛选/聚合查询
+        时间按“YYYY-MM-DD HH:MM:SS”的前缀比较，end_time包含在内（如 end_time="2026-02-03" 包含当天全部记录）
+        """
+        started = time.perf_counter()
+        conditions = ["log_path = ?"]
+        params: List = [os.path.abspath(log_file_path)]
+        if start_time:
+            conditions.append("timestamp >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append("timestamp < ? || '~'")
+            params.append(end_time)
+        for column, value in (("client_ip", client_ip), ("request_type", request_type),
+                              ("threat_level", threat_level)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if threats_only:
+            conditions.append("is_threat = 1")
+        if min_response_time_ms is not None:
+            conditions.append("response_time_ms >= ?")
+            params.append(int(min_response_time_ms))
+        where = " AND ".join(conditions)
+        limit = max(1, min(int(limit), 500))
+
+        if group_by is not None and group_by not in self.GROUP_BY_EXPRESSIONS:
+            raise ValueError(f"不支持的分组字段: {group_by}，可选: {', '.join(self.GROUP_BY_EXPRESSIONS)}")
+        if order_by not in self.ORDER_BY_EXPRESSIONS:
+            raise ValueError(f"不支持的排序方式: {order_by}，可选: {', '.join(self.ORDER_BY_EXPRESSIONS)}")
+
+        connection = self._connect()
+        try:
+            total = connection.execute(f"SELECT COUNT(*) FROM requests WHERE {where}", params).fetchone()[0]
+            if group_by:
+                expression = self.GROUP_BY_EXPRESSIONS[group_by]
+                order = "max_response_time_ms DESC" if order_by == "response_time" else "request_count DESC"
+                rows = connection.execute(
+                    f"""SELECT {expression} AS {group_by}, COUNT(*) AS request_count,
+                               SUM(is_threat) AS threat_count,
+                               ROUND(AVG(response_time_ms), 1) AS avg_response_time_ms,
+                               MAX(response_time_ms) AS max_response_time_ms,
+                               MIN(timestamp) AS first_seen, MAX(timestamp) AS last_seen
+                        FROM requests WHERE {where}
+                        GROUP BY {expression} ORDER BY {order} LIMIT ?""",
+                    params + [limit]
+                ).fetchall()
+                results = [dict(row) for row in rows]
+            else:
+                order = self.ORDER_BY_EXPRESSIONS["time" if order_by == "count" else order_by]
+                rows = connection.execute(
+                    f"""SELECT timestamp, client_ip, http_method, request_path, query_string, request_type,
+                               response_time_ms, log_level, is_threat, threat_level, threat_details, pending
+                        FROM requests WHERE {where} ORDER BY {order} LIMIT ?""",
+                    params + [limit]
+                ).fetchall()
+                results = []
+                for row in rows:
+                    item = dict(row)
+                    item["is_threat"] = bool(item["is_threat"])
+                    item["threat_details"] = json.loads(item["threat_details"])
+                    item["pending"] = bool(item["pending"])
+                    results.append(item)
+        finally:
+            connection.close()
+
+        return {
+            "total_matched": total,
+            "group_by": group_by,
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+
+class LogIndexTools:
+    """日志索引查询工具类"""
+
+    @staticmethod
+    @log_tool_call
+    def query_geoserver_log_index(log_file_path=None, start_time=None, end_time=None, client_ip=None,
+                                  request_type=None, threat_level=None, threats_only=False,
+                                  min_response_time_ms=None, group_by=None, order_by="time", limit=20):
+        """
+        查询GeoServer日志索引（查询前自动增量更新索引）
+
+        参数:
+            log_file_path (str): 日志文件路径，默认使用配置中的路径；不支持通配符
+            start_time / end_time (str): 时间范围，格式 YYYY-MM-DD[ HH:MM:SS]，end_time包含在内
+            client_ip / request_type / threat_level (str): 按客户端IP、请求类型、威胁等级筛选
+            threats_only (bool): 只返回威胁请求
+            min_response_time_ms (int): 最小响应时间
+            group_by (str): 分组聚合维度，返回每组的请求数、威胁数、响应时间统计
+            order_by (str): 排序方式 time/response_time/count
+            limit (int): 返回的记录数或分组数上限
+
+        返回:
+            dict: 匹配总数、记录/分组列表和索引更新信息
+        """
+        try:
+            if log_file_path is None:
+                log_file_path = config.DEFAULT_LOG_FILE_PATH
+            if any(ch in log_file_path for ch in "*?["):
+                raise ValueError("日志索引不支持通配符路径，请逐个文件查询")
+
+            index = GeoServerLogIndex(config.LOG_INDEX_DB_PATH)
+            index_info = index.update(log_file_path)
+            result = index.query(
+                log_file_path, start_time=start_time, end_time=end_time, client_ip=client_ip,
+                request_type=request_type, threat_level=threat_level, threats_only=threats_only,
+                min_response_time_ms=min_response_time_ms, group_by=group_by,
+                order_by=order_by, limit=limit
+            )
+            result["index"] = index_info
+            return result
+
+        except FileNotFoundError:
+            return {"error": f"日志文件不存在: {log_file_path}", "total_matched": 0, "results": []}
+        except Exception as e:
+            return {"error": f"查询失败: {str(e)}", "total_matched": 0, "results": []}
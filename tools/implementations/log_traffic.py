@@ -0,0 +1,251 @@
+"""
+GeoServer流量与延迟统计 - 按分钟聚合请求数、错误数和响应时间分位数，按小时/天查询时再合并
+- 维度：图层（geo_layer）、请求路径、客户端IP
+- 响应时间用可合并的对数分桶直方图（相对误差1%）估算分位数，不保留逐条数据
+- 聚合器与ThreatReportBuilder接口一致，可以走parse_ranges的多进程切块解析
+工具只返回紧凑的统计表，不返回原始记录
+"""
+
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from .log_decorator import log_tool_call
+from .log_analysis_tools import RequestCorrelationCache, parse_ranges, resolve_log_paths
+from config import config
+
+
+class LatencySketch:
+    """
+    对数分桶的响应时间直方图：桶边界按(1+α)/(1-α)等比增长，任意分位数的相对误差不超过α
+    两个直方图按桶相加即可合并，结果与一次性统计全部数据相同
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    _GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    _LOG_GAMMA = math.log(_GAMMA)
+
+    __slots__ = ("bins", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def add(self, value: int) -> None:
+        """记录一个响应时间（毫秒，必须大于0）"""
+        index = math.ceil(math.log(value) / self._LOG_GAMMA)
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def merge(self, other: "LatencySketch") -> None:
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[int]:
+        """估算分位数（q取0~1），没有数据时返回None"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # 桶内取几何中点，并限制在实际最小/最大值之间
+                estimate = 2 * self._GAMMA ** index / (self._GAMMA + 1)
+                return int(round(min(max(estimate, self.min), self.max)))
+        return self.max
+
+
+class TrafficBucket:
+    """单个（时间桶, 维度取值）的统计"""
+
+    __slots__ = ("count", "errors", "unfinished", "threats", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0        # 日志级别高于INFO的请求
+        self.unfinished = 0    # 没有等到耗时日志（无响应时间）的请求
+        self.threats = 0
+        self.latency = LatencySketch()
+
+    def merge(self, other: "TrafficBucket") -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.unfinished += other.unfinished
+        self.threats += other.threats
+        self.latency.merge(other.latency)
+
+
+class TrafficAggregator:
+    """
+    流式流量聚合器：逐条接收解析记录，按（维度, 分钟, 请求类型, 取值）累加到TrafficBucket
+    小时/天的统计在查询时由分钟桶合并得到
+    """
+
+    DIMENSIONS = ("geo_layer", "request_path", "client_ip")
+    INTERVALS = {"minute": 16, "hour": 13, "day": 10}  # 时间桶对应的时间戳前缀长度
+    ERROR_LEVELS = ("WARN", "WARNING", "ERROR", "SEVERE", "FATAL")
+    LAYER_PARAMS = ("typename", "typenames", "layers")  # geo_layer为空时，从查询参数取图层名
+
+    def __init__(self):
+        self.total_processed_lines = 0
+        self.total_valid_requests = 0
+        self.buckets: Dict[Tuple[str, str, str, str], TrafficBucket] = {}
+
+    @classmethod
+    def layers_of(cls, entry: Dict) -> List[str]:
+        """请求涉及的图层（一个请求可能同时查询多个图层）"""
+        if entry.get("geo_layer"):
+            return [entry["geo_layer"]]
+        for key, value in parse_qsl(entry.get("query_string") or ""):
+            if key.lower() in cls.LAYER_PARAMS and value:
+                return [layer.strip() for layer in value.split(",") if layer.strip()]
+        return []
+
+    def add(self, entry: Dict) -> None:
+        """累加一条解析记录"""
+        self.total_valid_requests += 1
+        minute = entry["timestamp"][:16]
+        request_type = entry.get("request_type", "")
+        response_time = entry.get("response_time_ms") or 0
+        is_error = entry.get("log_level", "").upper() in self.ERROR_LEVELS
+        for dimension, values in (("geo_layer", self.layers_of(entry)),
+                                  ("request_path", [entry.get("request_path", "")]),
+                                  ("client_ip", [entry.get("client_ip", "")])):
+            for value in values:
+                key = (dimension, minute, request_type, value)
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = TrafficBucket()
+                bucket.count += 1
+                bucket.errors += is_error
+                bucket.threats += bool(entry.get("is_threat"))
+                if response_time > 0:
+                    bucket.latency.add(response_time)
+                else:
+                    bucket.unfinished += 1
+
+    def merge(self, other: "TrafficAggregator") -> None:
+        """合并另一个聚合器的统计"""
+        self.total_processed_lines += other.total_processed_lines
+        self.total_valid_requests += other.total_valid_requests
+        for key, bucket in other.buckets.items():
+            existing = self.buckets.get(key)
+            if existing is None:
+                self.buckets[key] = bucket
+            else:
+                existing.merge(bucket)
+
+    def rollup(self, dimension: str, interval: str = "hour", start_time: Optional[str] = None,
+               end_time: Optional[str] = None, request_type: Optional[str] = None,
+               value: Optional[str] = None) -> Dict[Tuple[str, str], TrafficBucket]:
+        """把分钟桶合并为指定粒度的（时间桶, 维度取值）统计"""
+        prefix = self.INTERVALS[interval]
+        start = start_time[:16] if start_time else None
+        end = f"{end_time}~" if end_time else None
+        merged: Dict[Tuple[str, str], TrafficBucket] = {}
+        for (key_dimension, minute, key_type, key_value), bucket in self.buckets.items():
+            if key_dimension != dimension:
+                continue
+            if (start and minute < start) or (end and minute > end):
+                continue
+            if (request_type and key_type != request_type) or (value and key_value != value):
+                continue
+            bucket_time = minute[:prefix] + (":00" if interval == "hour" else "")
+            key = (bucket_time, key_value)
+            target = merged.get(key)
+            if target is None:
+                target = merged[key] = TrafficBucket()
+            target.merge(bucket)
+        return merged
+
+
+def build_traffic_aggregate(log_paths: Iterable[str], workers: Optional[int] = None) -> TrafficAggregator:
+    """解析一个或多个日志文件（按顺序视为连续的日志流）并聚合流量统计"""
+    aggregator = TrafficAggregator()
+    carry = RequestCorrelationCache()
+    parse_ranges([(path, 0, os.path.getsize(path)) for path in log_paths], aggregator, carry, workers)
+    for entry in carry.drain():
+        aggregator.add(entry)
+    return aggregator
+
+
+class LogTrafficTools:
+    """日志流量统计工具类"""
+
+    TABLE_COLUMNS = ["time", "value", "count", "errors", "unfinished", "threats",
+                     "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    SORT_COLUMNS = ("count", "errors", "unfinished", "threats", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+    @staticmethod
+    @log_tool_call
+    def aggregate_geoserver_traffic(log_file_path=None, group_by="geo_layer", interval="hour",
+                                    start_time=None, end_time=None, request_type=None, value=None,
+                                    sort_by="p95_ms", limit=20):
+        """
+        按时间桶和维度统计GeoServer请求量、错误数和响应时间分位数
+
+        参数:
+            log_file_path (str): 日志文件路径，默认使用配置中的路径；支持通配符匹配多个轮转日志
+            group_by (str): 统计维度 geo_layer/request_path/client_ip
+            interval (str): 时间粒度 minute/hour/day
+            start_time / end_time (str): 时间范围，格式 YYYY-MM-DD[ HH:MM]，end_time包含在内
+            request_type (str): 只统计指定请求类型（WFS/STATIC/OTHER）
+            value (str): 只统计指定的维度取值（如某个图层）
+            sort_by (str): 排序列，默认p95_ms（最慢的在前）
+            limit (int): 返回的行数上限
+
+        返回:
+            dict: 紧凑统计表（columns + rows），每行为一个（时间桶, 维度取值）
+        """
+        try:
+            if log_file_path is None:
+                log_file_path = config.DEFAULT_LOG_FILE_PATH
+            if group_by not in TrafficAggregator.DIMENSIONS:
+                raise ValueError(f"不支持的统计维度: {group_by}，可选: {', '.join(TrafficAggregator.DIMENSIONS)}")
+            if interval not in TrafficAggregator.INTERVALS:
+                raise ValueError(f"不支持的时间粒度: {interval}，可选: {', '.join(TrafficAggregator.INTERVALS)}")
+            if sort_by not in LogTrafficTools.SORT_COLUMNS:
+                raise ValueError(f"不支持的排序列: {sort_by}，可选: {', '.join(LogTrafficTools.SORT_COLUMNS)}")
+
+            aggregator = build_traffic_aggregate(resolve_log_paths(log_file_path))
+            merged = aggregator.rollup(group_by, interval, start_time, end_time, request_type, value)
+
+            rows = []
+            for (bucket_time, bucket_value), bucket in merged.items():
+                latency = bucket.latency
+                rows.append([
+                    bucket_time, bucket_value, bucket.count, bucket.errors, bucket.unfinished, bucket.threats,
+                    round(latency.total / latency.count) if latency.count else None,
+                    latency.quantile(0.5), latency.quantile(0.95), latency.quantile(0.99), latency.max
+                ])
+            sort_index = LogTrafficTools.TABLE_COLUMNS.index(sort_by)
+            # 没有响应时间的行排在最后，同值按时间先后
+            rows.sort(key=lambda row: row[0])
+            rows.sort(key=lambda row: -1 if row[sort_index] is None else row[sort_index], reverse=True)
+            limit = max(1, min(int(limit), 200))
+
+            return {
+                "group_by": group_by,
+                "interval": interval,
+                "total_valid_requests": aggregator.total_valid_requests,
+                "total_rows": len(rows),
+                "columns": LogTrafficTools.TABLE_COLUMNS,
+                "rows": rows[:limit]
+            }
+
+        except FileNotFoundError:
+            return {"error": f"日志文件不存在: {log_file_path}", "columns": [], "rows": []}
+        except Exception as e:
+            return {"error": f"统计失败: {str(e)}", "columns": [], "rows": []}
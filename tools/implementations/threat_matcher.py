@@ -0,0 +1,128 @@
+"""
+威胁特征匹配引擎 - 所有特征编译为一个组合正则，单次扫描报告全部命中的特征
+特征库从版本化的规则文件加载（config.THREAT_RULES_FILE），SecurityEngine和analyze_log_for_intrusion共用
+
+匹配不区分大小写：文本先整体转小写一次，再用小写的特征做区分大小写的匹配，
+比re.IGNORECASE快数倍（re模块对忽略大小写的多分支正则无法做首字符预筛选）
+"""
+
+import re
+import json
+import threading
+from typing import Dict, Iterable, List, Optional
+from config import config
+
+
+class ThreatRule:
+    """单条威胁特征"""
+
+    __slots__ = ("rule_id", "category", "pattern", "regex", "message", "analyzers")
+
+    def __init__(self, rule_id: str, category: str, pattern: str, regex: bool = False,
+                 message: str = "", analyzers: Iterable[str] = ()):
+        self.rule_id = rule_id
+        self.category = category
+        self.pattern = pattern            # 规则文件中的原始写法（报告中原样展示）
+        self.regex = regex                # False表示按字面量匹配
+        self.message = message
+        self.analyzers = tuple(analyzers)
+
+    @property
+    def expression(self) -> str:
+        """参与编译的正则表达式（匹配已转小写的文本）"""
+        if not self.regex:
+            return re.escape(self.pattern.lower())
+        # 正则特征应使用小写书写；含大写字母时局部忽略大小写，保证仍能匹配
+        return self.pattern if self.pattern == self.pattern.lower() else f"(?i:{self.pattern})"
+
+
+class ThreatMatcher:
+    """
+    多特征匹配器：
+    1. 先用不带分组的组合正则快速判断文本是否命中任何特征（绝大多数日志行在这一步结束）
+    2. 命中时再用前瞻组合正则逐位置扫描，命名分组标识命中的特征，重叠的命中也能报告
+    """
+
+    def __init__(self, rules: List[ThreatRule], version: str = ""):
+        self.rules = rules
+        self.version = version
+        self._rule_by_group = {f"r{index}": rule for index, rule in enumerate(rules)}
+        self._rule_regex = {rule.rule_id: re.compile(rule.expression) for rule in rules}
+        alternatives = [f"(?:{rule.expression})" for rule in rules]
+        named = [f"(?P<r{index}>{rule.expression})" for index, rule in enumerate(rules)]
+        self._any = re.compile("|".join(alternatives)) if rules else None
+        # 零宽前瞻：每个位置都尝试匹配，不会因为前一个命中消耗了文本而漏掉重叠的特征
+        self._scan = re.compile(f"(?=(?:{'|'.join(named)}))") if rules else None
+
+    def scan(self, *texts: str) -> List[ThreatRule]:
+        """扫描一段或多段文本，按规则文件中的顺序返回命中的特征（去重）"""
+        if self._any is None:
+            return []
+        hit_ids = set()
+        for text in texts:
+            if not text:
+                continue
+            text = text.lower()
+            if self._any.search(text):
+                self._scan_text(text, hit_ids)
+                if len(hit_ids) == len(self.rules):
+                    break
+        return [rule for rule in self.rules if rule.rule_id in hit_ids]
+
+    def _scan_text(self, text: str, hit_ids: set) -> None:
+        positions = []
+        for match in self._scan.finditer(text):
+            # 分组名r{index}在外层，lastgroup即命中的特征
+            hit_ids.add(self._rule_by_group[match.lastgroup].rule_id)
+            positions.append(match.start())
+        # 同一位置只会报告排在前面的特征，补查其余特征在这些位置上是否也能匹配
+        for rule in self.rules:
+            if rule.rule_id in hit_ids:
+                continue
+            regex = self._rule_regex[rule.rule_id]
+            if any(regex.match(text, position) for position in positions):
+                hit_ids.add(rule.rule_id)
+
+
+_matchers: Dict[tuple, ThreatMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def load_rules(rules_file: str) -> Dict:
+    """读取规则文件，返回 {"version": ..., "rules": [ThreatRule, ...]}"""
+    with open(rules_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = [
+        ThreatRule(
+            rule_id=item["id"],
+            category=item.get("category", ""),
+            pattern=item["pattern"],
+            regex=item.get("regex", False),
+            message=item.get("message", ""),
+            analyzers=item.get("analyzers", [])
+        )
+        for item in data.get("rules", [])
+    ]
+    return {"version": str(data.get("version", "")), "rules": rules}
+
+
+def get_threat_matcher(analyzer: str, rules_file: Optional[str] = None) -> ThreatMatcher:
+    """获取指定分析器使用的匹配器（按规则文件和分析器缓存，每个进程只编译一次）"""
+    rules_file = rules_file or config.THREAT_RULES_FILE
+    key = (rules_file, analyzer)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.get(key)
+            if matcher is None:
+                loaded = load_rules(rules_file)
+                rules = [rule for rule in loaded["rules"] if analyzer in rule.analyzers]
+                matcher = ThreatMatcher(rules, version=loaded["version"])
+                _matchers[key] = matcher
+    return matcher
+
+
+def reload_threat_matchers() -> None:
+    """清空已编译的匹配器，下次使用时重新读取规则文件"""
+    with _matchers_lock:
+        _matchers.clear()
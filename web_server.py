@@ -3,14 +3,17 @@
 本地大模型智能体Web服务器
 """
 
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, request, jsonify, render_template, session, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
+import uuid
 import logging
+import threading
 from config import config
 from tool_registry import ToolRegistry
-from agent_core import AgentCore
+from agent_core import AgentCore, create_http_session
+from session_manager import SessionManager
 import json
 import requests
 
@@ -35,31 +38,52 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 # 配置模板路径
 # app.template_folder = os.path.join(current_dir, 'static', 'chat')
 
-# 全局智能体实例
+# 全局智能体实例（所有会话共享工具注册表、系统提示词和连接池）
 agent_instance = None
+agent_init_lock = threading.Lock()
+
+# 会话管理器（每个浏览器会话独立的对话历史）
+session_manager = SessionManager(
+    max_sessions=config.SESSION_MAX_COUNT,
+    ttl_seconds=config.SESSION_TTL_SECONDS,
+    max_memory_bytes=config.SESSION_MAX_MEMORY_MB * 1024 * 1024,
+    max_history_messages=config.SESSION_MAX_HISTORY_MESSAGES
+)
 
 # 初始化智能体
 def initialize_agent():
     """初始化智能体"""
     global agent_instance
     
-    if agent_instance is None:
+    if agent_instance is not None:
+        return
+    
+    with agent_init_lock:
+        if agent_instance is not None:
+            return
         try:
             # 检查依赖
             check_dependencies()
             
+            # 创建Ollama连接池会话（健康检查与模型调用共用）
+            http_session = create_http_session(config)
+            
             # 检查Ollama服务
-            check_ollama_service()
+            check_ollama_service(http_session)
             
             # 初始化工具注册表
             tool_registry = ToolRegistry(config)
             tool_registry.load_all()
             
             # 初始化智能体核心
-            agent_instance = AgentCore(config, tool_registry)
+            agent_instance = AgentCore(config, tool_registry, http_session=http_session)
+            
+            # 后台预热模型，避免首个请求承担模型加载耗时
+            if config.MODEL_WARMUP_ENABLED:
+                agent_instance.start_model_warmer()
             print("✅ 智能体初始化完成!")
             print(f"📊 使用模型: {config.MODEL_NAME}")
-            print(f"🛠️  可用工具: {', '.join(tool_registry.implementations.keys())}")
+            print(f"🛠️  可用工具: {', '.join(tool_registry.list_tools())}")
         except Exception as e:
             print(f"❌ 初始化智能体失败: {e}")
             raise
@@ -75,10 +99,12 @@ def check_dependencies():
         print("请运行: pip install requests pyyaml pytz")
         sys.exit(1)
 
-def check_ollama_service():
+def check_ollama_service(http_session=None):
     """检查Ollama服务"""
     try:
-        response = requests.get(f"{config.OLLAMA_API_BASE}/tags", timeout=5)
+        client = http_session or requests
+        response = client.get(f"{config.OLLAMA_API_BASE}/tags",
+                              timeout=(config.OLLAMA_CONNECT_TIMEOUT, 5))
         if response.status_code != 200:
             print("❌ Ollama服务可能未运行或无法访问")
             print("请确保已启动Ollama: ollama serve")
@@ -88,6 +114,14 @@ def check_ollama_service():
         print(f"请检查Ollama是否运行在 {config.OLLAMA_API_BASE}")
         sys.exit(1)
 
+def get_conversation():
+    """获取当前浏览器会话的对话状态（会话ID保存在签名Cookie中）"""
+    session_id = session.get('sid')
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        session['sid'] = session_id
+    return session_manager.get_or_create(session_id)
+
 # 首页路由
 @app.route('/')
 def index():
@@ -113,8 +147,11 @@ def chat():
         # 确保智能体已初始化
         initialize_agent()
         
-        # 直接处理消息（AI会自动检查终端状态）
-        result = agent_instance.process_message(user_message)
+        # 直接处理消息（AI会自动检查终端状态），同一会话的请求串行执行
+        conversation = get_conversation()
+        with conversation.lock:
+            result = agent_instance.process_message(user_message, history=conversation.history)
+        session_manager.commit(conversation)
         
         # 记录处理结果
         logger.info(f"处理结果: {result}")
@@ -125,6 +162,48 @@ def chat():
         logger.error(f"处理请求时发生错误: {str(e)}", exc_info=True)
         return jsonify({"error": str(e), "terminal_commands": []}), 500
 
+# 流式聊天API路由（SSE）
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """流式聊天API，以Server-Sent Events逐个推送模型输出的增量文本"""
+    data = request.get_json(silent=True) or {}
+    logger.info(f"流式请求体 (JSON): {data}")
+    
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        logger.warning("用户消息为空")
+        return jsonify({"error": "请输入消息"}), 400
+    
+    # 确保智能体已初始化
+    initialize_agent()
+    
+    # 在响应开始前取得会话，保证会话Cookie随响应头下发
+    conversation = get_conversation()
+    
+    def generate():
+        # 同一会话的请求串行执行
+        with conversation.lock:
+            try:
+                for event in agent_instance.process_message_stream(user_message, history=conversation.history):
+                    if event["type"] == "done":
+                        logger.info(f"处理结果: {event}")
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            except Exception as e:
+                logger.error(f"流式处理请求时发生错误: {str(e)}", exc_info=True)
+                error_event = {"type": "error", "error": str(e), "terminal_commands": []}
+                yield f"data: {json.dumps(error_event, ensure_ascii=False)}\n\n"
+        session_manager.commit(conversation)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 关闭nginx缓冲，保证增量及时送达
+        }
+    )
+
 # 工具列表API路由
 @app.route('/api/tools', methods=['GET'])
 def get_tools():
@@ -149,7 +228,14 @@ def get_tools():
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    return jsonify({"status": "healthy", "model": config.MODEL_NAME})
+    return jsonify({"status": "healthy", "model": config.MODEL_NAME, "sessions": session_manager.stats()})
+
+# 模型性能指标路由
+@app.route('/api/metrics', methods=['GET'])
+def model_metrics():
+    """最近模型调用的加载耗时、提示词token数等指标"""
+    initialize_agent()
+    return jsonify(agent_instance.metrics.summary())
 
 # 终端状态查询路由（使用Cookie）
 @app.route('/api/terminal/status', methods=['GET'])
@@ -181,6 +267,6 @@ if __name__ == '__main__':
     # 启动Web服务器
     print(f"🚀 Web服务器启动在 http://localhost:28080")
     print(f"📊 使用模型: {config.MODEL_NAME}")
-    print(f"🛠️  可用工具: {', '.join(agent_instance.tool_registry.implementations.keys())}")
+    print(f"🛠️  可用工具: {', '.join(agent_instance.tool_registry.list_tools())}")
     
     app.run(host='0.0.0.0', port=28080, debug=False)